@@ -0,0 +1,102 @@
+"""Benchmark cold start: process launch to first successful / response.
+
+Usage: python benchmarks/cold_start.py [--runs 5] [--no-warm-up] [--record]
+
+Each run starts a fresh server process, polls / until it answers 200 and
+reports the time to that response and the latency of the request itself.
+With --record the median is appended to benchmarks/cold_start.jsonl so
+the startup time can be tracked across commits.
+"""
+import argparse
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY = Path(__file__).resolve().parent / 'cold_start.jsonl'
+
+SERVER = ("from retail.app import create_app; "
+          "create_app(warm={warm}).run(port={port}, debug=False, "
+          "use_reloader=False)")
+
+
+def free_port():
+    """Return a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_once(warm, timeout=30.0):
+    """Return (seconds to first 200 on /, latency of that request)."""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/'
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER.format(warm=warm, port=port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            sent = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    if response.status == 200:
+                        now = time.perf_counter()
+                        return now - start, now - sent
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError(f"Server did not answer {url} in {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def git_commit():
+    """Return the current commit hash, if available."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-warm-up', dest='warm', action='store_false')
+    parser.add_argument('--record', action='store_true',
+                        help=f"append the result to {HISTORY.name}")
+    args = parser.parse_args()
+
+    results = [run_once(args.warm) for _ in range(args.runs)]
+    ready = statistics.median(r[0] for r in results)
+    first = statistics.median(r[1] for r in results)
+    print(f"cold start to first / response: {ready * 1000:.1f} ms median, "
+          f"first request {first * 1000:.1f} ms "
+          f"({args.runs} runs, warm-up {'on' if args.warm else 'off'})")
+
+    if args.record:
+        entry = {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'warm_up': args.warm,
+            'runs': args.runs,
+            'ready_ms': round(ready * 1000, 1),
+            'first_request_ms': round(first * 1000, 1)
+        }
+        with open(HISTORY, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ import os
 import signal
 import platform
 import atexit
+import urllib.error
+import urllib.request
 import warnings
 
 server_process = None
@@ -40,11 +42,28 @@ def start_flask_server():
             preexec_fn=os.setsid
         )
 
-    # Give the server time to start up
-    time.sleep(3)
+    # Wait until the server answers instead of sleeping a fixed time
+    wait_for_server("http://localhost:8080/")
     return server_process
 
 
+def wait_for_server(url, timeout=10):
+    """Poll url until the server responds or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server_process.poll() is not None:
+            return False
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return True
+        except urllib.error.HTTPError:
+            # The server is up, even if it answered with an error
+            return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    return False
+
+
 def stop_flask_server():
     """Stop the Flask server."""
     global server_process
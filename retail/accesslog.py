@@ -0,0 +1,147 @@
+"""Non-blocking, batched JSON-lines access and audit log."""
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+
+class AccessLog:
+    """Structured log written from a background thread.
+
+    ``access`` and ``audit`` only put a record on a bounded in-memory
+    queue and never wait for I/O. A writer thread drains the queue in
+    batches of up to ``batch_size`` records, writing each batch with a
+    single write, and rotates the file once it grows past ``max_bytes``
+    (``access.jsonl`` -> ``access.jsonl.1`` ... ``.{backups}``).
+
+    Under overload, once the queue is more than ``sample_above`` full,
+    only one in ``sample_rate`` access records is kept; audit records
+    are always kept while there is room. Records that find the queue
+    full are dropped and counted.
+    """
+
+    def __init__(self, path, max_queue=10000, batch_size=256,
+                 max_bytes=10 * 1024 * 1024, backups=5,
+                 sample_above=0.5, sample_rate=10):
+        self.path = Path(path)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_above = sample_above
+        self.sample_rate = sample_rate
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self.rotations = 0
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._seen = 0
+        self._closed = False
+        self._thread = None
+        self._file = None
+
+    def access(self, **fields):
+        """Log a request; may be sampled or dropped under overload."""
+        if self._queue.qsize() >= self.max_queue * self.sample_above:
+            self._seen += 1
+            if self._seen % self.sample_rate:
+                self.sampled_out += 1
+                return
+            fields['sample_rate'] = self.sample_rate
+        self._put('access', fields)
+
+    def audit(self, event, **fields):
+        """Log an auditable event such as a checkout; never sampled."""
+        self._put('audit', {'event': event, **fields})
+
+    def stats(self):
+        """Return queue depth and write, drop and sampling counters."""
+        return {'queued': self._queue.qsize(), 'written': self.written,
+                'dropped': self.dropped, 'sampled_out': self.sampled_out,
+                'batches': self.batches, 'rotations': self.rotations}
+
+    def close(self):
+        """Write out queued records and stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            # Blocks only until the writer makes room
+            self._queue.put(None)
+            thread.join()
+        else:
+            self._write(self._drain([]))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _put(self, kind, fields):
+        if self._closed:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self._closed:
+                    self._thread = threading.Thread(
+                        target=self._run, name='access-log', daemon=True)
+                    self._thread.start()
+        record = {'ts': round(time.time(), 3), 'type': kind}
+        record.update(fields)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, batch):
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._drain([self._queue.get()])
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            try:
+                self._write(records)
+            except OSError:
+                self.dropped += len(records)
+                time.sleep(0.1)
+            if stop:
+                self._write(self._drain([]))
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        data = ''.join(json.dumps(r, separators=(',', ':')) + '\n'
+                       for r in records)
+        if self._file is None:
+            os.makedirs(self.path.parent, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(data)
+        self._file.flush()
+        self.written += len(records)
+        self.batches += 1
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f'{self.path.name}.{i}')
+            if source.exists():
+                os.replace(source, self.path.with_name(
+                    f'{self.path.name}.{i + 1}'))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        else:
+            os.remove(self.path)
+        self.rotations += 1
@@ -0,0 +1,123 @@
+"""Admission control and load shedding per route class."""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Route classes in priority order, lowest priority first
+ROUTE_CLASSES = ('browse', 'search', 'cart', 'checkout')
+
+DEFAULT_LIMITS = {
+    # concurrency: max in-flight requests of this class
+    # rate/burst: per-client token bucket (requests/sec, bucket size)
+    # share: fraction of total capacity this class may use before it is
+    # shed, so lower-priority traffic gives way to checkout first
+    'browse': {'concurrency': 32, 'rate': 20.0, 'burst': 40, 'share': 0.6},
+    'search': {'concurrency': 16, 'rate': 10.0, 'burst': 20, 'share': 0.7},
+    'cart': {'concurrency': 16, 'rate': 10.0, 'burst': 20, 'share': 0.85},
+    'checkout': {'concurrency': 16, 'rate': 2.0, 'burst': 5, 'share': 1.0},
+}
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens/sec up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; return 0 on success or seconds until one is free."""
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Admit, rate limit or shed requests by route class and client.
+
+    Each client gets a token bucket per route class (answered with 429
+    when empty). Each class has its own concurrency limit, and may only
+    use its ``share`` of ``max_inflight`` across all classes, so under
+    overload browsing is shed (503) before search, cart and checkout.
+    """
+
+    def __init__(self, limits=None, max_inflight=64, max_clients=10000):
+        limits = limits or {}
+        self.limits = {name: {**DEFAULT_LIMITS[name], **limits.get(name, {})}
+                       for name in ROUTE_CLASSES}
+        self.max_inflight = max_inflight
+        self.max_clients = max_clients
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._metrics = {name: {'inflight': 0, 'admitted': 0,
+                                'rate_limited': 0, 'shed': 0}
+                         for name in ROUTE_CLASSES}
+
+    def admit(self, route_class, client):
+        """Admit a request or raise ``Rejected``.
+
+        Every admitted request must be paired with ``release()``.
+        """
+        limits = self.limits[route_class]
+        metrics = self._metrics[route_class]
+        with self._lock:
+            wait = self._bucket(route_class, client, limits).take()
+            if wait:
+                metrics['rate_limited'] += 1
+                raise Rejected(429, math.ceil(wait), "Too many requests")
+            if (metrics['inflight'] >= limits['concurrency']
+                    or self.inflight >= self.max_inflight * limits['share']):
+                metrics['shed'] += 1
+                raise Rejected(503, 1, "Service busy, please retry")
+            metrics['inflight'] += 1
+            metrics['admitted'] += 1
+            self.inflight += 1
+
+    def release(self, route_class):
+        """Release an admitted request."""
+        with self._lock:
+            self._metrics[route_class]['inflight'] -= 1
+            self.inflight -= 1
+
+    def metrics(self):
+        """Return limits and counters per route class."""
+        with self._lock:
+            return {
+                'max_inflight': self.max_inflight,
+                'inflight': self.inflight,
+                'classes': {name: dict(self._metrics[name],
+                                       limits=dict(self.limits[name]))
+                            for name in ROUTE_CLASSES}
+            }
+
+    def _bucket(self, route_class, client, limits):
+        # Bounded LRU of buckets so unique clients cannot grow it forever
+        key = (route_class, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limits['rate'], limits['burst'])
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
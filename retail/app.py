@@ -1,12 +1,187 @@
-from flask import Flask, render_template, request, redirect, url_for, session, \
-    flash, jsonify
-import json
+import atexit
+import hmac
 import os
+import signal
+import sys
+import time
+import uuid
 from pathlib import Path
 
+if __package__ in (None, ''):
+    # Allow running as a script (python retail/app.py)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import click
+from flask import Flask, render_template, request, redirect, url_for, session, \
+    flash, jsonify, g, Response
+from werkzeug.serving import is_running_from_reloader
+
+from retail.accesslog import AccessLog
+from retail.admission import AdmissionController, Rejected
+from retail.events import TooManyStreams
+from retail.idempotency import IdempotencyCache, KeyReused
+from retail.indexes import SORTS
+from retail.inventory import apply_adjustments, parse_adjustments
+from retail.orders import OrderPipeline, OrderRejected, QueueFull
+from retail.pagecache import PageCache
+from retail.shards import Shard, ShardRouter
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # For session management
 
+# Order ledger group commit: max orders per fsync and max seconds a batch
+# window stays open waiting for more orders
+app.config.setdefault('LEDGER_MAX_BATCH', 64)
+app.config.setdefault('LEDGER_MAX_LATENCY', 0.005)
+
+# Write-behind persistence: seconds to coalesce catalog changes before a
+# write, and the number of dirty products that forces an early write
+app.config.setdefault('PERSIST_FLUSH_INTERVAL', 0.5)
+app.config.setdefault('PERSIST_MAX_DIRTY', 100)
+
+# Checkouts per second on one SKU above which its decrements are combined.
+# None (the default) always takes the plain catalog lock: under the GIL
+# combining has not beaten it in benchmarks/hot_sku.py
+app.config.setdefault('HOT_SKU_THRESHOLD', None)
+app.config.setdefault('HOT_SKU_WINDOW', 1.0)
+
+# Reload the catalog when products.json is edited outside the app
+# (inotify on Linux, stat polling elsewhere)
+app.config.setdefault('WATCH_CATALOG', True)
+app.config.setdefault('WATCH_DEBOUNCE', 0.2)
+app.config.setdefault('WATCH_POLL_INTERVAL', 1.0)
+
+# Idempotent checkout: how long and how many checkout results are kept
+app.config.setdefault('IDEMPOTENCY_TTL', 600)
+app.config.setdefault('IDEMPOTENCY_MAX_KEYS', 10000)
+
+# Admission control: total in-flight requests, and per route class
+# overrides of retail.admission.DEFAULT_LIMITS
+app.config.setdefault('ADMISSION_ENABLED', True)
+app.config.setdefault('ADMISSION_MAX_INFLIGHT', 64)
+app.config.setdefault('ADMISSION_LIMITS', {})
+
+# Where carts and stock counters live: 'file' keeps carts in the session
+# cookie and stock in products.json; 'redis' shares both between hosts
+# through a Redis-protocol server at REDIS_URL
+app.config.setdefault('STORE_BACKEND',
+                      os.environ.get('RETAIL_STORE_BACKEND', 'file'))
+app.config.setdefault('REDIS_URL', os.environ.get('RETAIL_REDIS_URL',
+                                                  'redis://localhost:6379/0'))
+app.config.setdefault('REDIS_POOL_SIZE', 16)
+
+# Storefronts served, each from its own catalog shard with its own file,
+# lock, index and caches. A request picks its store with ?store= (which
+# the session remembers) or the X-Store-Id header. Requests naming none
+# get 'default', or the first store listed when 'default' is not served
+app.config.setdefault('STORES', [
+    store.strip()
+    for store in os.environ.get('RETAIL_STORES', 'default').split(',')
+    if store.strip()])
+
+# Micro-cache of the listing page for visitors without a session: seconds
+# a rendered page is reused (0 disables) and how many pages are kept
+app.config.setdefault('PAGE_CACHE_TTL', 2.0)
+app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 256)
+
+# Soft stock holds: adding to the cart holds the quantity for
+# STOCK_HOLD_TTL seconds and other carts only see stock minus active
+# holds. Holds are kept per process, so they need the 'file' backend
+app.config.setdefault('STOCK_HOLDS_ENABLED', False)
+app.config.setdefault('STOCK_HOLD_TTL', 900)
+app.config.setdefault('STOCK_HOLD_TICK', 1.0)
+
+# JSON-lines access and audit log, written in batches from a background
+# thread: queued records before new ones are dropped, file size that
+# triggers rotation, and rotated files kept
+app.config.setdefault('ACCESS_LOG_ENABLED', True)
+app.config.setdefault('ACCESS_LOG_MAX_QUEUE', 10000)
+app.config.setdefault('ACCESS_LOG_MAX_BYTES', 10 * 1024 * 1024)
+app.config.setdefault('ACCESS_LOG_BACKUPS', 5)
+
+# Search result cache per store, invalidated when the catalog changes:
+# queries with results, and queries that found nothing, kept
+app.config.setdefault('SEARCH_CACHE_SIZE', 1024)
+app.config.setdefault('SEARCH_NEGATIVE_CACHE_SIZE', 4096)
+
+# Asynchronous checkout: /checkout validates the cart, queues the order
+# and answers 202 with its id; a pool of ORDER_WORKERS commits stock and
+# records it, retrying failures. Poll /orders/<id> for the outcome.
+# Accepted orders are journaled durably before the 202, and orders a
+# crash left unfinished are resumed on the next start. Each process
+# locks its own journal, data/order_journal[.<n>].jsonl, and resumes what
+# the previous holder of that journal left unfinished
+app.config.setdefault('ASYNC_CHECKOUT', False)
+app.config.setdefault('ORDER_WORKERS', 4)
+app.config.setdefault('ORDER_QUEUE_SIZE', 1000)
+app.config.setdefault('ORDER_RETRIES', 3)
+app.config.setdefault('ORDER_RETRY_BACKOFF', 0.1)
+
+# Concurrent /events/stock streams per store; each holds a server thread
+app.config.setdefault('EVENT_MAX_STREAMS', 32)
+
+# Products per page on the listing page and the JSON API
+app.config.setdefault('PAGE_SIZE', 50)
+
+# Token required in the X-Admin-Token header by admin endpoints; they are
+# disabled while it is unset
+app.config.setdefault('ADMIN_TOKEN', os.environ.get('RETAIL_ADMIN_TOKEN'))
+
+# Route class of each endpoint; unlisted endpoints are not limited
+ENDPOINT_CLASSES = {
+    'index': 'browse',
+    'list_products_api': 'browse',
+    'search': 'search',
+    'add_to_cart': 'cart',
+    'view_cart': 'cart',
+    'clear_cart': 'cart',
+    'checkout': 'checkout',
+    'order_status': 'browse',
+}
+
+DEFAULT_PRODUCTS = [
+    {
+        "name": "laptop",
+        "price": 999.99,
+        "description": "High-quality laptop with powerful specs",
+        "stock": 10
+    },
+    {
+        "name": "phone",
+        "price": 499.99,
+        "description": "Latest smartphone with great features",
+        "stock": 15
+    },
+    {
+        "name": "headphones",
+        "price": 99.99,
+        "description": "Noise-cancelling wireless headphones",
+        "stock": 20
+    },
+    {
+        "name": "keyboard",
+        "price": 59.99,
+        "description": "Mechanical gaming keyboard",
+        "stock": 8
+    }
+]
+
+# Store served by the original data/products.json; other stores live in
+# data/stores/<store id>/products.json
+DEFAULT_STORE = 'default'
+
+_ledger = None
+_orders = None
+_redis_pool = None
+
+
+class CheckoutError(Exception):
+    """A checkout failed for a temporary reason and may be retried.
+
+    Raised inside ``run_once`` so the failure is never stored as the
+    outcome of an idempotency key.
+    """
+
 
 # Data setup - in a real app you'd use a database
 def get_data_folder():
@@ -15,60 +190,293 @@ def get_data_folder():
 
 
 def load_products():
-    """Load products from the data file."""
-    try:
-        with open(get_data_folder() / 'products.json', 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Create products.json if it doesn't exist
-        products = [
-            {
-                "name": "laptop",
-                "price": 999.99,
-                "description": "High-quality laptop with powerful specs",
-                "stock": 10
-            },
-            {
-                "name": "phone",
-                "price": 499.99,
-                "description": "Latest smartphone with great features",
-                "stock": 15
-            },
-            {
-                "name": "headphones",
-                "price": 99.99,
-                "description": "Noise-cancelling wireless headphones",
-                "stock": 20
-            },
-            {
-                "name": "keyboard",
-                "price": 59.99,
-                "description": "Mechanical gaming keyboard",
-                "stock": 8
-            }
-        ]
-
-        os.makedirs(get_data_folder(), exist_ok=True)
-        with open(get_data_folder() / 'products.json', 'w') as f:
-            json.dump(products, f)
-
-        return products
+    """Load products from the in-memory catalog."""
+    return current_shard().catalog.products()
 
 
 def save_products(products):
-    """Save products to the data file."""
-    os.makedirs(get_data_folder(), exist_ok=True)
-    with open(get_data_folder() / 'products.json', 'w') as f:
-        json.dump(products, f)
+    """Replace the catalog; the data file is written behind the request."""
+    current_shard().catalog.replace(products)
+
+
+def make_shard(store_id):
+    """Create the catalog shard of a store."""
+    folder = get_data_folder()
+    if store_id != DEFAULT_STORE:
+        folder = folder / 'stores' / store_id
+    shard = Shard(store_id, folder / 'products.json',
+                  defaults=DEFAULT_PRODUCTS,
+                  flush_interval=app.config['PERSIST_FLUSH_INTERVAL'],
+                  max_dirty=app.config['PERSIST_MAX_DIRTY'],
+                  hot_threshold=app.config['HOT_SKU_THRESHOLD'],
+                  window=app.config['HOT_SKU_WINDOW'],
+                  hold_ttl=app.config['STOCK_HOLD_TTL'],
+                  hold_tick=app.config['STOCK_HOLD_TICK'],
+                  holds=holds_enabled(),
+                  max_streams=app.config['EVENT_MAX_STREAMS'],
+                  search_cache_size=app.config['SEARCH_CACHE_SIZE'],
+                  search_negative_size=app.config[
+                      'SEARCH_NEGATIVE_CACHE_SIZE'])
+    shard.catalog.subscribe(lambda names: publish_stock(shard, names))
+    atexit.register(shard.close)
+    return shard
+
+
+shards = ShardRouter(make_shard, store_ids=app.config['STORES'],
+                     default=DEFAULT_STORE)
+page_cache = PageCache(ttl=app.config['PAGE_CACHE_TTL'],
+                       max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'])
+checkouts = IdempotencyCache(max_entries=app.config['IDEMPOTENCY_MAX_KEYS'],
+                             ttl=app.config['IDEMPOTENCY_TTL'])
+access_log = AccessLog(get_data_folder() / 'access.jsonl',
+                       max_queue=app.config['ACCESS_LOG_MAX_QUEUE'],
+                       max_bytes=app.config['ACCESS_LOG_MAX_BYTES'],
+                       backups=app.config['ACCESS_LOG_BACKUPS'])
+atexit.register(access_log.close)
+admission = AdmissionController(
+    limits=app.config['ADMISSION_LIMITS'],
+    max_inflight=app.config['ADMISSION_MAX_INFLIGHT'])
+
+
+def get_ledger():
+    """Get the order ledger, creating it on first use."""
+    global _ledger
+    if _ledger is None:
+        # Imported lazily to keep it off the startup path
+        from retail.ledger import OrderLedger
+        _ledger = OrderLedger(get_data_folder() / 'orders.jsonl',
+                              max_batch=app.config['LEDGER_MAX_BATCH'],
+                              max_latency=app.config['LEDGER_MAX_LATENCY'])
+        atexit.register(_ledger.close)
+    return _ledger
+
+
+def current_shard():
+    """Get the catalog shard of the store the request is for."""
+    if 'shard' not in g:
+        g.shard = shards.get(shards.default)
+    return g.shard
+
+
+def get_orders():
+    """Get the asynchronous order pipeline, starting it on first use."""
+    global _orders
+    if _orders is None:
+        # The ledger must outlive the workers; atexit runs in reverse
+        get_ledger()
+        _orders = OrderPipeline(
+            [('stock', commit_order_stock), ('ledger', record_order)],
+            workers=app.config['ORDER_WORKERS'],
+            max_queue=app.config['ORDER_QUEUE_SIZE'],
+            retries=app.config['ORDER_RETRIES'],
+            backoff=app.config['ORDER_RETRY_BACKOFF'],
+            on_failed=undo_order, on_finished=log_order,
+            journal=open_order_journal())
+        atexit.register(_orders.close)
+    return _orders
+
+
+def open_order_journal():
+    """Open the first order journal no other process holds."""
+    from retail.ledger import JournalLocked, OrderJournal
+    slot = 0
+    while True:
+        name = ('order_journal.jsonl' if slot == 0
+                else f'order_journal.{slot}.jsonl')
+        try:
+            return OrderJournal(get_data_folder() / name,
+                                max_batch=app.config['LEDGER_MAX_BATCH'],
+                                max_latency=app.config['LEDGER_MAX_LATENCY'])
+        except JournalLocked:
+            slot += 1
+
+
+def get_store(shard=None):
+    """Get a store's shared Redis store, or None with the file backend."""
+    global _redis_pool
+    shard = shard or current_shard()
+    if shard.store is None and app.config['STORE_BACKEND'] == 'redis':
+        from retail.redis_store import RedisPool, RedisStore
+        if _redis_pool is None:
+            _redis_pool = RedisPool.from_url(
+                app.config['REDIS_URL'],
+                max_connections=app.config['REDIS_POOL_SIZE'])
+            atexit.register(_redis_pool.close)
+        prefix = ('retail:' if shard.store_id == DEFAULT_STORE
+                  else f'retail:{shard.store_id}:')
+        store = RedisStore(_redis_pool, prefix=prefix)
+        store.seed_stock(shard.catalog.products())
+        shard.store = store
+        apply_stock_levels(shard, store.stock_levels())
+    return shard.store
+
+
+def apply_stock_levels(shard, levels):
+    """Copy stock levels from the shared store into a shard's catalog."""
+    catalog = shard.catalog
+    changed = []
+    with catalog.lock:
+        for name, level in levels.items():
+            product = catalog.find(name)
+            if product and product['stock'] != level:
+                product['stock'] = level
+                changed.append(product['name'])
+    if changed:
+        catalog.changed(changed)
+
+
+def refresh_stock():
+    """Bring displayed stock up to date with the shared store."""
+    store = get_store()
+    if store is not None:
+        apply_stock_levels(current_shard(), store.stock_levels())
+
+
+def holds_enabled():
+    """Check if add-to-cart holds stock."""
+    return (app.config['STOCK_HOLDS_ENABLED']
+            and app.config['STORE_BACKEND'] == 'file')
+
+
+def reserve_stock(cart):
+    """Decrement stock for a cart; return (reserved, error message)."""
+    shard = current_shard()
+    store = get_store(shard)
+    if store is None:
+        if not holds_enabled():
+            return shard.stock.reserve(cart)
+        # Units held for other carts are not available to this one
+        cart_id = get_cart_id()
+        return shard.stock.reserve(
+            cart, held=lambda name: shard.holds.held(name, cart_id))
+    # The cart was read already; one more round trip checks, decrements
+    # and deletes it atomically
+    reserved, result = store.reserve(cart, session.get('cart_id'))
+    if not reserved:
+        return False, result
+    g.cart = []
+    apply_stock_levels(shard, result)
+    return True, None
+
+
+def release_stock(cart):
+    """Return stock reserved for a cart that could not be completed."""
+    store = get_store()
+    if store is None:
+        current_shard().stock.release(cart)
+    else:
+        store.release(cart)
+        save_cart(cart)
+        refresh_stock()
+
+
+def release_holds(cart):
+    """Drop the stock holds of the visitor's cart."""
+    if holds_enabled() and 'cart_id' in session:
+        current_shard().holds.release_cart(
+            session['cart_id'], [item['name'] for item in cart])
+
+
+def adjust_stock(rows, shard):
+    """Apply a batch of stock adjustments to a store as one transaction."""
+    store = get_store(shard)
+    if store is not None:
+        apply_stock_levels(shard, store.stock_levels())
+    return apply_adjustments(shard.catalog, rows,
+                             apply=store.adjust if store else None)
+
+
+def cart_key():
+    """Get the session key of the visitor's cart in the current store."""
+    store_id = current_shard().store_id
+    return 'cart' if store_id == DEFAULT_STORE else f'cart:{store_id}'
+
+
+def get_cart():
+    """Get the visitor's shopping cart."""
+    if 'cart' not in g:
+        store = get_store()
+        if store is None:
+            g.cart = session.get(cart_key(), [])
+        else:
+            cart_id = session.get('cart_id')
+            g.cart = store.get_cart(cart_id) if cart_id else []
+    return g.cart
+
+
+def get_cart_id():
+    """Get the id of the visitor's cart, creating one if needed."""
+    if 'cart_id' not in session:
+        session['cart_id'] = uuid.uuid4().hex
+    return session['cart_id']
+
+
+def save_cart(cart):
+    """Save the visitor's shopping cart."""
+    store = get_store()
+    if store is None:
+        session[cart_key()] = cart
+    elif cart or g.get('cart', True):
+        store.save_cart(get_cart_id(), cart)
+    g.cart = cart
+
+
+def start_watcher(shard):
+    """Start watching a store's catalog file for external edits."""
+    if shard.watcher is None and app.config['WATCH_CATALOG']:
+        # Imported lazily (pulls in ctypes) to keep it off the startup path
+        from retail.watcher import watch
+        catalog = shard.catalog
+        os.makedirs(catalog.path.parent, exist_ok=True)
+        shard.watcher = watch(catalog.path.parent, catalog.path.name,
+                              catalog.reload,
+                              debounce=app.config['WATCH_DEBOUNCE'],
+                              interval=app.config['WATCH_POLL_INTERVAL'])
+    return shard.watcher
+
+
+def warm_up():
+    """Do the first request's one-off work up front.
+
+    Loads every store's catalog shard and builds its indexes in parallel,
+    compiles every template and starts the catalog watchers.
+    """
+    loaded = shards.load(app.config['STORES'])
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    get_ledger()
+    if app.config['ASYNC_CHECKOUT']:
+        get_orders()
+    for shard in loaded:
+        get_store(shard)
+        start_watcher(shard)
+
+
+def create_app(warm=True):
+    """Return the application, warmed up and ready to serve.
+
+    WSGI servers should load ``retail.app:create_app()`` so each worker
+    warms up before it accepts traffic.
+    """
+    if warm:
+        warm_up()
+    return app
+
+
+def publish_stock(shard, names):
+    """Push the new stock of changed products to event stream clients."""
+    changes = []
+    for name in names:
+        product = shard.catalog.find(name)
+        if product:
+            changes.append({'sku': product['name'], 'stock': product['stock']})
+    if changes:
+        shard.events.publish('stock', changes)
 
 
 def find_product(name):
     """Find a product by name."""
-    products = load_products()
-    for product in products:
-        if product['name'].lower() == name.lower():
-            return product
-    return None
+    return current_shard().catalog.find(name)
 
 
 def is_product_in_stock(name, quantity=1):
@@ -76,29 +484,181 @@ def is_product_in_stock(name, quantity=1):
     product = find_product(name)
     if not product:
         return False, "Product not found"
-    if product['stock'] <= 0:
+    return check_available(product, product['stock'], quantity)
+
+
+def check_available(product, available, quantity):
+    """Check that quantity units of a product are available."""
+    if available <= 0:
         return False, "This product is currently out of stock"
-    if product['stock'] < quantity:
-        return False, f"Only {product['stock']} units available"
+    if available < quantity:
+        return False, f"Only {available} units available"
     return True, product
 
 
+@app.before_request
+def start_timer():
+    """Note when the request started, for the access log."""
+    g.started = time.perf_counter()
+
+
+@app.before_request
+def select_store():
+    """Route the request to its store's catalog shard."""
+    store_id = (request.headers.get('X-Store-Id')
+                or request.args.get('store'))
+    if not store_id:
+        try:
+            g.shard = shards.get(session.get('store', shards.default))
+        except KeyError:
+            # The remembered store is no longer served
+            session.pop('store', None)
+            g.shard = shards.get(shards.default)
+        return None
+    try:
+        g.shard = shards.get(store_id)
+    except KeyError:
+        return app.response_class("Unknown store", status=404,
+                                  mimetype='text/plain')
+    if ('X-Store-Id' not in request.headers
+            and store_id != session.get('store', shards.default)):
+        session['store'] = store_id
+    return None
+
+
+@app.before_request
+def ensure_watcher():
+    """Start the catalog watcher in the serving process."""
+    shard = current_shard()
+    if shard.watcher is None:
+        start_watcher(shard)
+
+
+@app.before_request
+def admit_request():
+    """Rate limit and shed requests before they reach a route."""
+    route_class = ENDPOINT_CLASSES.get(request.endpoint)
+    if not route_class or not app.config['ADMISSION_ENABLED']:
+        return None
+    try:
+        admission.admit(route_class, request.remote_addr)
+    except Rejected as e:
+        return app.response_class(e.reason, status=e.status,
+                                  headers={'Retry-After': str(e.retry_after)},
+                                  mimetype='text/plain')
+    g.route_class = route_class
+    return None
+
+
+@app.after_request
+def log_request(response):
+    """Queue an access log record; never waits on log I/O."""
+    if app.config['ACCESS_LOG_ENABLED'] and 'started' in g:
+        cart = g.get('cart')
+        access_log.access(
+            method=request.method,
+            route=request.url_rule.rule if request.url_rule else None,
+            path=request.path,
+            status=response.status_code,
+            latency_ms=round((time.perf_counter() - g.started) * 1000, 3),
+            cart_size=(sum(item.get('quantity', 0) for item in cart)
+                       if cart is not None else None),
+            checkout=g.get('checkout_outcome'))
+    return response
+
+
+@app.teardown_request
+def release_request(exc):
+    """Release the admission slot held by the request."""
+    route_class = g.pop('route_class', None)
+    if route_class:
+        admission.release(route_class)
+
+
+@app.context_processor
+def inject_cart():
+    """Make the cart available to every template."""
+    return {'cart': get_cart()}
+
+
+# Fresh idempotency key for each rendered checkout form
+app.jinja_env.globals['idempotency_key'] = lambda: uuid.uuid4().hex
+
+
+def listing_query():
+    """Read listing filters, sort order and page from the query string."""
+    sort = request.args.get('sort')
+    return {
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'in_stock': request.args.get('in_stock') in ('1', 'true', 'on'),
+        'sort': sort if sort in SORTS else None,
+        'page': max(request.args.get('page', 1, type=int), 1),
+        'per_page': app.config['PAGE_SIZE']
+    }
+
+
+def list_products(query):
+    """Return one page of products for a listing query, and the total."""
+    offset = (query['page'] - 1) * query['per_page']
+    if (query['min_price'] is None and query['max_price'] is None
+            and not query['in_stock'] and query['sort'] is None):
+        # Unfiltered listing in catalog order
+        products = load_products()
+        return products[offset:offset + query['per_page']], len(products)
+    return current_shard().index.query(
+        query['min_price'], query['max_price'], query['in_stock'],
+        query['sort'] or 'price', offset=offset, limit=query['per_page'])
+
+
 # Routes
 @app.route('/')
 def index():
-    """Home page that displays all products."""
-    products = load_products()
-    cart = session.get('cart', [])
+    """Home page that displays all products.
+
+    Visitors without a session cookie have no cart or messages, so their
+    page is served from the micro-cache while the catalog is unchanged.
+    """
+    catalog = current_shard().catalog
+    anonymous = (app.config['PAGE_CACHE_TTL'] > 0 and
+                 app.config['SESSION_COOKIE_NAME'] not in request.cookies)
+    page_key = (current_shard().store_id, request.full_path)
+    if anonymous:
+        page = page_cache.get(page_key, catalog.version)
+        if page is not None:
+            return page
+
+    refresh_stock()
+    version = catalog.version
+    query = listing_query()
+    products, total = list_products(query)
+    cart = get_cart()
     cart_count = sum(item.get('quantity', 0) for item in cart)
-    error = session.pop('error', None)
-    success = session.pop('success', None)
+    # Only pop what is there; popping a missing key still rewrites the cookie
+    error = session.pop('error') if 'error' in session else None
+    success = session.pop('success') if 'success' in session else None
 
-    return render_template('index.html',
+    page = render_template('index.html',
                            products=products,
+                           total=total,
+                           query=query,
                            cart=cart,
                            cart_count=cart_count,
                            error=error,
                            success=success)
+    if anonymous:
+        page_cache.put(page_key, version, page)
+    return page
+
+
+@app.route('/api/products')
+def list_products_api():
+    """JSON listing with the same filters, sorting and paging as /."""
+    refresh_stock()
+    query = listing_query()
+    products, total = list_products(query)
+    return jsonify(products=products, total=total, page=query['page'],
+                   per_page=query['per_page'])
 
 
 @app.route('/search', methods=['POST'])
@@ -110,7 +670,13 @@ def search():
         session['error'] = "Please enter a product name"
         return redirect(url_for('index'))
 
-    product = find_product(product_name)
+    refresh_stock()
+    # Cached per normalised query until products are replaced; results
+    # are the live product dicts, so stock changes show without a miss
+    shard = current_shard()
+    product = shard.searches.run(product_name,
+                                 shard.catalog.structure_version,
+                                 find_product)
 
     if not product:
         session['error'] = "Product not found"
@@ -118,7 +684,7 @@ def search():
 
     return render_template('product.html',
                            product=product,
-                           cart=session.get('cart', []))
+                           cart=get_cart())
 
 
 @app.route('/add_to_cart', methods=['POST'])
@@ -144,7 +710,14 @@ def add_to_cart():
 
     # Product exists and is in stock
     product = product_or_message
-    cart = session.get('cart', [])
+    if holds_enabled():
+        # Hold the units so they are still there at checkout
+        held, available = current_shard().holds.hold(
+            get_cart_id(), product['name'], quantity, product['stock'])
+        if not held:
+            flash(check_available(product, available, quantity)[1])
+            return redirect(url_for('index'))
+    cart = get_cart()
 
     # Check if product already in cart
     found = False
@@ -161,57 +734,281 @@ def add_to_cart():
             'quantity': quantity
         })
 
-    session['cart'] = cart
+    save_cart(cart)
     flash(f"Added {quantity} {product_name}(s) to cart")
     return redirect(url_for('index'))
 
 
-@app.route('/checkout', methods=['GET', 'POST'])
+@app.route('/checkout', methods=['POST'])
 def checkout():
-    """Checkout process."""
-    cart = session.get('cart', [])
+    """Checkout process.
 
-    # Check for empty cart
-    if not cart:
-        flash("Cart is empty")
+    Requests carrying an idempotency key (``Idempotency-Key`` header or
+    ``idempotency_key`` form field) run once; retries and double submits
+    get the stored outcome instead of checking out again.
+
+    With ``ASYNC_CHECKOUT`` the order is only validated and queued here,
+    and the response is a 202 pointing at its ``/orders/<id>`` status.
+    """
+    key = (request.headers.get('Idempotency-Key')
+           or request.form.get('idempotency_key'))
+    cart = get_cart()
+    if app.config['ASYNC_CHECKOUT']:
+        return accept_checkout(cart, key)
+    try:
+        message, completed = run_once(key, cart,
+                                      lambda: process_checkout(cart))
+        g.checkout_outcome = 'completed' if completed else 'rejected'
+    except KeyReused:
+        return key_reused()
+    except CheckoutError as e:
+        message, completed = str(e), False
+        g.checkout_outcome = 'error'
+
+    if app.config['ACCESS_LOG_ENABLED']:
+        access_log.audit('checkout', outcome=g.checkout_outcome,
+                         message=message, idempotency_key=key,
+                         items=sum(item.get('quantity', 0) for item in cart),
+                         total=round(sum(item.get('price', 0)
+                                         * item.get('quantity', 0)
+                                         for item in cart), 2))
+    if completed:
+        # Clear cart
+        save_cart([])
+    flash(message)
+    return redirect(url_for('index'))
+
+
+def run_once(key, cart, func):
+    """Run a checkout once per idempotency key, or directly without one.
+
+    Only final outcomes are stored: ``func`` raises ``CheckoutError`` for
+    a temporary failure, so a retry with the same key tries again.
+    Keys are scoped to the store and the visitor's cart, so one client's
+    key never returns another client's outcome. The cart is fingerprinted
+    too: replaying a key with a different, non-empty cart raises
+    ``KeyReused``. A completed checkout empties the cart, so a retry of
+    it (empty cart) still gets the stored outcome.
+    """
+    if not key:
+        return func()
+    scoped = (current_shard().store_id, get_cart_id(), key)
+    fingerprint = None
+    if cart:
+        fingerprint = tuple(sorted((item['name'].lower(), item['quantity'])
+                                   for item in cart))
+    return checkouts.run(scoped, func, fingerprint=fingerprint)
+
+
+def key_reused():
+    """Respond to an idempotency key replayed for a different cart."""
+    g.checkout_outcome = 'rejected'
+    message = "Idempotency key was already used for a different cart"
+    if wants_json():
+        return jsonify(error=message), 422
+    flash(message)
+    return redirect(url_for('index'))
+
+
+def accept_checkout(cart, key):
+    """Accept stage of an asynchronous checkout; responds 202 at once."""
+    try:
+        order_id, message = run_once(key, cart, lambda: accept_order(cart))
+    except KeyReused:
+        return key_reused()
+    except CheckoutError as e:
+        g.checkout_outcome = 'error'
+        if wants_json():
+            return jsonify(error=str(e)), 503, {'Retry-After': '1'}
+        flash(str(e))
         return redirect(url_for('index'))
+    except QueueFull as e:
+        g.checkout_outcome = 'shed'
+        return app.response_class(str(e), status=503,
+                                  headers={'Retry-After': '1'},
+                                  mimetype='text/plain')
+
+    g.checkout_outcome = 'accepted' if order_id else 'rejected'
+    if app.config['ACCESS_LOG_ENABLED']:
+        access_log.audit('checkout', outcome=g.checkout_outcome,
+                         message=message, idempotency_key=key,
+                         order_id=order_id)
+    if order_id is None:
+        if wants_json():
+            return jsonify(error=message), 400
+        flash(message)
+        return redirect(url_for('index'))
+
+    # The order carries its own copy of the cart from here on
+    save_cart([])
+    return order_response(get_orders().status(order_id), 202)
+
+
+def accept_order(cart):
+    """Validate a cart and queue it as an order; return (order id, error)."""
+    if not cart:
+        return None, "Cart is empty"
 
     # Check for simulated checkout error
     if session.get('simulate_checkout_error'):
         session.pop('simulate_checkout_error', None)
-        flash("An unexpected error occurred during checkout")
-        return redirect(url_for('index'))
+        raise CheckoutError("An unexpected error occurred during checkout")
 
-    # Check stock for all items
-    products = load_products()
-    for item in cart:
-        for product in products:
-            if product['name'].lower() == item['name'].lower():
-                if product['stock'] < item['quantity']:
-                    flash(
-                        f"{item['name']} is out of stock. Only {product['stock']} available.")
-                    return redirect(url_for('index'))
-                break
-
-    # Process order - update stock
+    # Cheap check only; stock is committed by the worker
     for item in cart:
-        for product in products:
-            if product['name'].lower() == item['name'].lower():
-                product['stock'] -= item['quantity']
-                break
+        product = find_product(item['name'])
+        if not product:
+            return None, "Product not found"
+        if product['stock'] < item['quantity']:
+            return None, (f"{item['name']} is out of stock. "
+                          f"Only {product['stock']} available.")
 
-    save_products(products)
+    # Returns once the order is journaled, so a 202 is never lost
+    try:
+        order_id = get_orders().submit({
+            'items': [dict(item) for item in cart],
+            'total': round(sum(item['price'] * item['quantity']
+                               for item in cart), 2),
+            'store_id': current_shard().store_id,
+            'cart_id': session.get('cart_id')
+        })
+    except OSError:
+        raise CheckoutError("An unexpected error occurred during checkout")
+    return order_id, None
 
-    # Clear cart
-    session['cart'] = []
-    flash("Thank you for your purchase!")
-    return redirect(url_for('index'))
+
+def commit_order_stock(order):
+    """Order stage: decrement stock for all items, or reject the order.
+
+    Stock is taken at most once per order id, so a stage replayed from
+    the journal after a crash does not take it again.
+    """
+    shard = shards.get(order['store_id'])
+    store = get_store(shard)
+    if store is not None:
+        reserved, result = store.reserve(order['items'],
+                                         order_id=order['order_id'])
+        if not reserved:
+            raise OrderRejected(result)
+        apply_stock_levels(shard, result)
+        return
+
+    cart_id = order['cart_id']
+    held = None
+    if holds_enabled() and cart_id:
+        def held(name):
+            return shard.holds.held(name, cart_id)
+    reserved, message = shard.stock.reserve(order['items'], held=held,
+                                            order_id=order['order_id'])
+    if not reserved:
+        raise OrderRejected(message)
+    if held is not None:
+        shard.holds.release_cart(cart_id,
+                                 [item['name'] for item in order['items']])
+
+
+def record_order(order):
+    """Order stage: record the order; returns once it is durable."""
+    ledger = get_ledger()
+    # A crash may have hit after the ledger write but before the journal
+    if order.get('recovered') and any(
+            o['order_id'] == order['order_id'] for o in ledger.orders()):
+        return
+    ledger.record(order['items'], store_id=order['store_id'],
+                  order_id=order['order_id'])
+
+
+def undo_order(order, done):
+    """Drop a failed order's holds and return any stock it committed."""
+    shard = shards.get(order['store_id'])
+    # Its cart was emptied when the order was accepted
+    if shard.holds is not None and order['cart_id']:
+        shard.holds.release_cart(order['cart_id'],
+                                 [item['name'] for item in order['items']])
+    if 'stock' not in done:
+        return
+    store = get_store(shard)
+    if store is None:
+        shard.stock.release(order['items'], order['order_id'])
+    else:
+        store.release(order['items'], order['order_id'])
+        apply_stock_levels(shard, store.stock_levels())
+
+
+def log_order(order):
+    """Audit the outcome of an asynchronous order."""
+    if app.config['ACCESS_LOG_ENABLED']:
+        access_log.audit('order', outcome=order['status'],
+                         order_id=order['order_id'],
+                         store_id=order['store_id'],
+                         attempts=order['attempts'],
+                         message=order['message'], total=order['total'])
+
+
+def wants_json():
+    """Check if the client prefers JSON to HTML."""
+    return request.accept_mimetypes.best_match(
+        ['application/json', 'text/html']) == 'application/json'
+
+
+def order_response(order, status=200):
+    """Render an order's status as JSON or as a self-refreshing page."""
+    public = {key: order[key] for key in (
+        'order_id', 'status', 'stage', 'message', 'total', 'store_id',
+        'created_at', 'updated_at')}
+    headers = {'Location': url_for('order_status',
+                                   order_id=order['order_id'])}
+    if wants_json():
+        return jsonify(public), status, headers
+    return render_template('order.html', order=public), status, headers
+
+
+def process_checkout(cart):
+    """Check out a cart; return the message to show and whether it completed.
+
+    Raises ``CheckoutError`` when the checkout failed for a reason that
+    a retry may not hit.
+    """
+    # Check for empty cart
+    if not cart:
+        return "Cart is empty", False
+
+    # Check for simulated checkout error
+    if session.get('simulate_checkout_error'):
+        session.pop('simulate_checkout_error', None)
+        raise CheckoutError("An unexpected error occurred during checkout")
+
+    # Check stock for all items and update it in one step
+    reserved, message = reserve_stock(cart)
+    if not reserved:
+        return message, False
+
+    # Record the order; returns once its group commit is durable
+    try:
+        get_ledger().record(cart, store_id=current_shard().store_id)
+    except OSError:
+        release_stock(cart)
+        raise CheckoutError("An unexpected error occurred during checkout")
+
+    release_holds(cart)
+    return "Thank you for your purchase!", True
+
+
+@app.route('/orders/<order_id>')
+def order_status(order_id):
+    """Report the progress of an asynchronous checkout."""
+    order = _orders.status(order_id) if _orders is not None else None
+    if order is None:
+        if wants_json():
+            return jsonify(error="Order not found"), 404
+        return render_template('error.html', error="Order not found"), 404
+    return order_response(order)
 
 
 @app.route('/cart')
 def view_cart():
     """View shopping cart."""
-    cart = session.get('cart', [])
+    cart = get_cart()
     total = sum(
         item.get('price', 0) * item.get('quantity', 0) for item in cart)
     return render_template('cart.html', cart=cart, total=total)
@@ -220,7 +1017,8 @@ def view_cart():
 @app.route('/clear_cart')
 def clear_cart():
     """Clear the shopping cart."""
-    session['cart'] = []
+    release_holds(get_cart())
+    save_cart([])
     flash("Cart has been cleared")
     return redirect(url_for('index'))
 
@@ -228,16 +1026,18 @@ def clear_cart():
 @app.route('/simulate_out_of_stock')
 def simulate_out_of_stock():
     """Simulate a product going out of stock."""
-    products = load_products()
-
     # Find the product in the cart and set its stock to 0
-    cart = session.get('cart', [])
+    cart = get_cart()
     if cart:
-        for product in products:
-            if product['name'].lower() == cart[0]['name'].lower():
+        product = find_product(cart[0]['name'])
+        if product:
+            catalog = current_shard().catalog
+            with catalog.lock:
                 product['stock'] = 0
-                save_products(products)
-                break
+            catalog.changed([product['name']])
+            store = get_store()
+            if store is not None:
+                store.set_stock({product['name']: 0})
 
     flash("Stock levels have been updated")
     return redirect(url_for('index'))
@@ -250,6 +1050,95 @@ def simulate_checkout_error():
     return redirect(url_for('index'))
 
 
+@app.route('/events/stock')
+def stock_stream():
+    """Stream stock changes as Server-Sent Events.
+
+    Clients that cannot resume from their ``Last-Event-ID`` are sent a
+    ``resync`` event with the stock of every product.
+    """
+    shard = current_shard()
+    try:
+        stream = shard.events.stream(
+            request.headers.get('Last-Event-ID'),
+            snapshot=lambda: [{'sku': p['name'], 'stock': p['stock']}
+                              for p in shard.catalog.snapshot()])
+    except TooManyStreams:
+        return app.response_class("Too many event streams", status=503,
+                                  headers={'Retry-After': '5'},
+                                  mimetype='text/plain')
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route('/admin/stock/bulk', methods=['POST'])
+def bulk_adjust_stock():
+    """Apply a JSON or CSV batch of absolute or delta stock updates."""
+    token = app.config['ADMIN_TOKEN']
+    if not token or not hmac.compare_digest(
+            request.headers.get('X-Admin-Token', ''), token):
+        return jsonify(error="Forbidden"), 403
+    try:
+        rows = parse_adjustments(request.get_data(as_text=True))
+    except (ValueError, KeyError, TypeError):
+        rows = None
+    if not isinstance(rows, list):
+        return jsonify(error="Invalid adjustment batch"), 400
+
+    applied, results = adjust_stock(rows, current_shard())
+    if app.config['ACCESS_LOG_ENABLED']:
+        access_log.audit('stock_adjust', applied=applied, rows=len(rows),
+                         store_id=current_shard().store_id,
+                         remote_addr=request.remote_addr)
+    return jsonify(applied=applied, results=results), 200 if applied else 422
+
+
+@app.cli.command('adjust-stock')
+@click.argument('batch', type=click.File('r'))
+@click.option('--store', 'store_id', default=None,
+              help="Store whose catalog is adjusted; the default store "
+                   "if not given.")
+def adjust_stock_command(batch, store_id):
+    """Apply a JSON or CSV batch of stock adjustments from BATCH.
+
+    This rewrites products.json from outside the server. Without Redis a
+    running server reloads the file and loses any checkouts it has not
+    written out yet, so stop it first or POST the batch to
+    /admin/stock/bulk instead.
+    """
+    try:
+        shard = shards.get(store_id or shards.default)
+    except KeyError:
+        raise click.BadParameter(f"Unknown store {store_id}")
+    try:
+        rows = parse_adjustments(batch.read())
+    except (ValueError, KeyError, TypeError):
+        rows = None
+    if not isinstance(rows, list):
+        raise click.BadParameter("Invalid adjustment batch",
+                                 param_hint='BATCH')
+    applied, results = adjust_stock(rows, shard)
+    for result in results:
+        if result['status'] == 'error':
+            click.echo(f"row {result['row']}: {result['error']}", err=True)
+    if not applied:
+        click.echo("No changes applied", err=True)
+        raise SystemExit(1)
+    shard.persistence.flush()
+    click.echo(f"Applied {len(results)} stock adjustments")
+
+
+@app.route('/metrics')
+def metrics():
+    """Expose admission control, cache, shard, logging and order counters."""
+    return jsonify(admission=admission.metrics(),
+                   page_cache=page_cache.stats(),
+                   shards=shards.stats(),
+                   access_log=access_log.stats(),
+                   orders=_orders.stats() if _orders is not None else None)
+
+
 # Error handling
 @app.errorhandler(404)
 def page_not_found(e):
@@ -268,7 +1157,10 @@ if __name__ == '__main__':
     # Create data directory if it doesn't exist
     os.makedirs(get_data_folder(), exist_ok=True)
 
-    # Ensure product data exists
-    load_products()
+    # Exit through atexit on SIGTERM so pending writes are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
+    # With debug on this process only runs the reloader; warm up the
+    # child process that actually serves requests
+    create_app(warm=is_running_from_reloader())
     app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""In-memory product catalog backed by a JSON file."""
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class Catalog:
+    """Product catalog held in memory and persisted as a JSON file.
+
+    The file is read once, on first access. Mutations happen in memory
+    under ``lock`` and are announced with ``changed()``, which bumps
+    ``version`` and notifies subscribers (e.g. the write-behind queue).
+    ``structure_version`` only moves when the set of product objects is
+    replaced, so caches holding the live product dicts, whose stock is
+    always current, can key on it and survive stock changes.
+
+    ``applied`` holds the ids of the last ``max_applied`` orders whose
+    stock change has been made, so replaying an order never applies it
+    twice. They are persisted next to the file, and written first, so
+    a crash can lose an unflushed change but never repeat one.
+    """
+
+    def __init__(self, path, defaults=(), max_applied=10000):
+        self.path = Path(path)
+        self.defaults = defaults
+        self.lock = threading.RLock()
+        self.version = 0
+        self.structure_version = 0
+        self.max_applied = max_applied
+        self.applied = OrderedDict()
+        self._applied_path = self.path.with_name(self.path.stem
+                                                 + '.orders.json')
+        self._applied_persisted = None
+        self._products = None
+        self._by_name = {}
+        self._listeners = []
+        # Contents of the file as last read or written by this catalog
+        self._persisted = None
+
+    def products(self):
+        """Return the live list of products, loading it if needed."""
+        if self._products is None:
+            with self.lock:
+                if self._products is None:
+                    self._set(self._read())
+        return self._products
+
+    def find(self, name):
+        """Find a product by name (case-insensitive)."""
+        self.products()
+        return self._by_name.get(name.lower())
+
+    def subscribe(self, listener):
+        """Call ``listener(names)`` whenever products change."""
+        self._listeners.append(listener)
+
+    def changed(self, names):
+        """Announce that the named products were mutated in memory."""
+        with self.lock:
+            self.version += 1
+        for listener in self._listeners:
+            listener(names)
+
+    def is_applied(self, order_id):
+        """Return whether an order's stock change is in the catalog."""
+        self.products()
+        return order_id in self.applied
+
+    def mark_applied(self, order_id, applied=True):
+        """Record whether an order's stock change is in the catalog.
+
+        The caller holds ``lock`` and announces the change.
+        """
+        self.products()
+        if not applied:
+            self.applied.pop(order_id, None)
+            return
+        self.applied[order_id] = None
+        while len(self.applied) > self.max_applied:
+            self.applied.popitem(last=False)
+
+    def replace(self, products):
+        """Replace the whole catalog."""
+        with self.lock:
+            self._set(products)
+            self.structure_version += 1
+        self.changed([product['name'] for product in products])
+
+    def snapshot(self):
+        """Return a copy of the products that is safe to serialise."""
+        with self.lock:
+            return [dict(product) for product in self.products()]
+
+    def write(self, names=None):
+        """Atomically write the current catalog to disk."""
+        with self.lock:
+            data = json.dumps(self.snapshot())
+            applied = json.dumps(list(self.applied))
+        if applied != (self._applied_persisted or '[]'):
+            _write_atomic(self._applied_path, applied)
+            self._applied_persisted = applied
+        if data == self._persisted:
+            return
+        _write_atomic(self.path, data)
+        self._persisted = data
+
+    def reload(self):
+        """Reload the file if it was changed outside this catalog.
+
+        Returns whether the catalog was replaced. Our own writes are
+        recognised and ignored.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = f.read()
+            products = json.loads(data)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Missing or half-written; keep serving what we have
+            return False
+        if data == self._persisted:
+            return False
+        self._persisted = data
+        self.replace(products)
+        return True
+
+    def _set(self, products):
+        self._products = products
+        self._by_name = {product['name'].lower(): product
+                         for product in products}
+
+    def _read(self):
+        try:
+            with open(self._applied_path, 'r') as f:
+                self._applied_persisted = f.read()
+            self.applied = OrderedDict.fromkeys(
+                json.loads(self._applied_persisted))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        try:
+            with open(self.path, 'r') as f:
+                self._persisted = f.read()
+            return json.loads(self._persisted)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Create the file from the defaults if it doesn't exist
+            products = [dict(product) for product in self.defaults]
+            os.makedirs(self.path.parent, exist_ok=True)
+            self._persisted = json.dumps(products)
+            with open(self.path, 'w') as f:
+                f.write(self._persisted)
+            return products
+
+
+def _write_atomic(path, data):
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
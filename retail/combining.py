@@ -0,0 +1,160 @@
+"""Stock reservation with request combining for hot SKUs."""
+import threading
+import time
+from collections import deque
+
+
+class _Request:
+    __slots__ = ('items', 'held', 'order_id', 'result')
+
+    def __init__(self, items, held, order_id):
+        self.items = items
+        self.held = held
+        self.order_id = order_id
+        self.result = None
+
+
+class RateTracker:
+    """Approximate per-key request rate over a fixed window.
+
+    Updates are not locked; the rate only steers which path a request
+    takes, so an occasional lost increment is harmless.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._counts = {}
+
+    def hit(self, key):
+        """Count a request for key and return its current rate per second."""
+        now = time.monotonic()
+        start, count, rate = self._counts.get(key, (now, 0, 0.0))
+        elapsed = now - start
+        if elapsed >= self.window:
+            rate = count / elapsed
+            start, count = now, 0
+        count += 1
+        self._counts[key] = (start, count, rate)
+        return max(rate, count / self.window)
+
+    def rate(self, key):
+        """Return the current rate per second for key without counting."""
+        start, count, rate = self._counts.get(key, (0, 0, 0.0))
+        return max(rate, count / self.window)
+
+    def above(self, threshold):
+        """Return the keys whose rate is at least threshold, sorted."""
+        return sorted(key for key in list(self._counts)
+                      if self.rate(key) >= threshold)
+
+
+class StockCombiner:
+    """Reserve stock for carts, combining concurrent hot-SKU requests.
+
+    Carts touching only cold SKUs take the catalog lock directly. When
+    any SKU in a cart exceeds ``hot_threshold`` requests per second the
+    request is queued instead; whichever waiting thread acquires the
+    combiner role drains the queue and applies every queued request in
+    one pass under a single catalog lock, then announces the change
+    once. Each request still gets its own accept/reject.
+
+    A ``hot_threshold`` of None disables combining and rate tracking.
+    """
+
+    def __init__(self, catalog, hot_threshold=50.0, window=1.0):
+        self.catalog = catalog
+        self.hot_threshold = hot_threshold
+        self.rates = RateTracker(window)
+        self.combined_batches = 0
+        self.combined_requests = 0
+        self._queue = deque()
+        self._combiner = threading.Lock()
+
+    def reserve(self, items, held=None, order_id=None):
+        """Decrement stock for all items, or none of them.
+
+        ``held(name)``, when given, returns units of a product held for
+        other carts, which are not available to this one. With an
+        ``order_id`` the change is made at most once per order; a repeat
+        succeeds without touching stock.
+
+        Returns ``(True, None)`` on success and ``(False, message)`` when
+        an item does not have enough stock.
+        """
+        hot = False
+        for item in items if self.hot_threshold is not None else ():
+            rate = self.rates.hit(item['name'].lower())
+            hot = hot or rate >= self.hot_threshold
+        if not hot:
+            with self.catalog.lock:
+                result = self._apply(items, held, order_id)
+            if result[0]:
+                self.catalog.changed([item['name'] for item in items])
+            return result
+
+        request = _Request(items, held, order_id)
+        self._queue.append(request)
+        with self._combiner:
+            # A previous combiner may already have applied this request
+            if request.result is None:
+                self._combine()
+        return request.result
+
+    def stats(self):
+        """Return the threshold, the SKUs now hot and combining counters."""
+        return {'hot_threshold': self.hot_threshold,
+                'hot_skus': (self.rates.above(self.hot_threshold)
+                             if self.hot_threshold is not None else []),
+                'combined_batches': self.combined_batches,
+                'combined_requests': self.combined_requests}
+
+    def release(self, items, order_id=None):
+        """Return previously reserved stock."""
+        with self.catalog.lock:
+            if order_id is not None:
+                self.catalog.mark_applied(order_id, False)
+            for item in items:
+                product = self.catalog.find(item['name'])
+                if product:
+                    product['stock'] += item['quantity']
+        self.catalog.changed([item['name'] for item in items])
+
+    def _combine(self):
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        if not batch:
+            return
+        names = set()
+        with self.catalog.lock:
+            for request in batch:
+                request.result = self._apply(request.items, request.held,
+                                             request.order_id)
+                if request.result[0]:
+                    names.update(item['name'] for item in request.items)
+        if names:
+            self.catalog.changed(sorted(names))
+        self.combined_batches += 1
+        self.combined_requests += len(batch)
+
+    def _apply(self, items, held=None, order_id=None):
+        # Caller holds the catalog lock
+        if order_id is not None and self.catalog.is_applied(order_id):
+            return True, None
+        for item in items:
+            product = self.catalog.find(item['name'])
+            if not product:
+                continue
+            available = product['stock']
+            if held is not None:
+                available = max(available - held(item['name']), 0)
+            if available < item['quantity']:
+                return False, (f"{item['name']} is out of stock. "
+                               f"Only {available} available.")
+        for item in items:
+            product = self.catalog.find(item['name'])
+            if product:
+                product['stock'] -= item['quantity']
+        if order_id is not None:
+            self.catalog.mark_applied(order_id)
+        return True, None
@@ -0,0 +1,157 @@
+"""In-process event broadcaster for Server-Sent Events."""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class TooManyStreams(Exception):
+    """Raised when the broadcaster already serves max_streams streams."""
+
+
+class _Stream:
+    """Iterator over a stream that gives its slot back exactly once.
+
+    A generator closed before it starts never runs its ``finally``, so
+    the slot is released here instead.
+    """
+
+    def __init__(self, generator, release):
+        self._generator = generator
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._generator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        self._generator.close()
+        if not self._released:
+            self._released = True
+            self._release()
+
+
+class Broadcaster:
+    """Fan out events to any number of subscribers from one ring buffer.
+
+    Publishing appends to a bounded history and wakes waiting readers;
+    it costs the same whatever the number of subscribers. Subscribers
+    hold nothing but the id of the last event they have seen, so idle
+    connections cost no memory here and a reconnecting client resumes
+    from its ``Last-Event-ID`` while it is still in the history.
+
+    Event ids on the wire carry a per-instance epoch. A client whose id
+    comes from another process, or has fallen out of the history, gets
+    a ``resync`` event with a full snapshot instead of silently missing
+    events. At most ``max_streams`` streams are served at once.
+    """
+
+    def __init__(self, history=1024, max_streams=32):
+        self.max_streams = max_streams
+        self.epoch = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._streams = 0
+
+    @property
+    def streams(self):
+        """Number of streams currently open."""
+        return self._streams
+
+    def publish(self, event, data):
+        """Publish an event and return its id."""
+        payload = json.dumps(data, separators=(',', ':'))
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event, payload))
+            self._cond.notify_all()
+            return self._last_id
+
+    def since(self, last_id, timeout=None):
+        """Return events after last_id, waiting up to timeout for one."""
+        with self._cond:
+            if self._last_id <= last_id:
+                self._cond.wait(timeout)
+            return [e for e in self._events if e[0] > last_id]
+
+    def event_id(self, last_event_id):
+        """Parse a ``Last-Event-ID`` header; None if it is not ours."""
+        epoch, _, number = (last_event_id or '').partition(':')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def stream(self, last_event_id=None, snapshot=None, heartbeat=15.0,
+               max_duration=300.0):
+        """Return an iterator of SSE-formatted text.
+
+        The stream ends after max_duration and the browser reconnects.
+        Comment lines are sent every ``heartbeat`` seconds to keep idle
+        connections open through proxies. ``snapshot()`` supplies the
+        data of ``resync`` events. Raises TooManyStreams when full.
+        """
+        with self._cond:
+            if self._streams >= self.max_streams:
+                raise TooManyStreams(self.max_streams)
+            self._streams += 1
+        return _Stream(self._stream(last_event_id, snapshot, heartbeat,
+                                    max_duration), self._release)
+
+    def _release(self):
+        with self._cond:
+            self._streams -= 1
+
+    def _stream(self, last_event_id, snapshot, heartbeat, max_duration):
+        deadline = time.monotonic() + max_duration
+        yield 'retry: 3000\n\n'
+        last_id = self._last_id
+        if last_event_id is not None:
+            resumed = self.event_id(last_event_id)
+            if self._resumable(resumed):
+                last_id = resumed
+            elif snapshot is not None:
+                last_id, text = self._resync(snapshot)
+                yield text
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = self.since(last_id, min(heartbeat, remaining))
+            if not self._resumable(last_id) and snapshot is not None:
+                # Fell behind by more than the history holds
+                last_id, text = self._resync(snapshot)
+                yield text
+                continue
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for event_id, event, payload in events:
+                yield self._format(event_id, event, payload)
+                last_id = event_id
+
+    def _resumable(self, last_id):
+        with self._cond:
+            if last_id is None or last_id > self._last_id:
+                return False
+            oldest = self._events[0][0] if self._events else self._last_id + 1
+            return last_id >= oldest - 1
+
+    def _resync(self, snapshot):
+        # Take the id first: anything published during the snapshot is
+        # sent again afterwards, which is harmless
+        last_id = self._last_id
+        payload = json.dumps(snapshot(), separators=(',', ':'))
+        return last_id, self._format(last_id, 'resync', payload)
+
+    def _format(self, event_id, event, payload):
+        return (f'id: {self.epoch}:{event_id}\nevent: {event}\n'
+                f'data: {payload}\n\n')
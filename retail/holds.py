@@ -0,0 +1,86 @@
+"""Time-bounded stock holds for carts."""
+import threading
+import time
+
+from retail.timerwheel import HierarchicalTimerWheel
+
+
+class StockHolds:
+    """Soft reservations of stock made when items are added to a cart.
+
+    A hold keeps ``quantity`` units of a product for one cart for
+    ``ttl`` seconds, refreshed whenever the cart adds more of it. Other
+    carts see ``stock - held`` as available. Expiry runs on a
+    hierarchical timer wheel advanced on each call, so holds lapse
+    without any scan or background thread.
+    """
+
+    def __init__(self, ttl=900.0, tick=1.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._wheel = HierarchicalTimerWheel(tick=tick, now=clock())
+        self._held = {}
+        self._holds = {}
+
+    def held(self, name, cart_id=None):
+        """Return units of a product held by carts other than cart_id."""
+        name = name.lower()
+        with self._lock:
+            self._wheel.advance(self.clock())
+            own = self._holds.get((cart_id, name))
+            return self._held.get(name, 0) - (own[0] if own else 0)
+
+    def hold(self, cart_id, name, quantity, stock):
+        """Hold ``quantity`` more units for a cart.
+
+        ``stock`` is the product's current stock. Returns ``(held,
+        available)``, where available is how many more units the cart
+        could have held before this call.
+        """
+        key = (cart_id, name.lower())
+        with self._lock:
+            now = self.clock()
+            self._wheel.advance(now)
+            own = self._holds.get(key)
+            own_quantity = own[0] if own else 0
+            available = max(stock - self._held.get(key[1], 0), 0)
+            if quantity > available:
+                return False, available
+            if own:
+                self._wheel.cancel(own[1])
+            timer = self._wheel.schedule(now + self.ttl,
+                                         lambda: self._expire(key))
+            self._holds[key] = (own_quantity + quantity, timer)
+            self._held[key[1]] = self._held.get(key[1], 0) + quantity
+            return True, available
+
+    def release_cart(self, cart_id, names):
+        """Drop a cart's holds on the named products."""
+        with self._lock:
+            for name in names:
+                hold = self._holds.get((cart_id, name.lower()))
+                if hold:
+                    self._wheel.cancel(hold[1])
+                    self._drop((cart_id, name.lower()))
+
+    def stats(self):
+        """Return the number of active holds and how many have expired."""
+        with self._lock:
+            if self._holds:
+                self._wheel.advance(self.clock())
+            return {'active': len(self._holds), 'expired': self.expired}
+
+    def _expire(self, key):
+        # Called by the wheel with self._lock held
+        self.expired += 1
+        self._drop(key)
+
+    def _drop(self, key):
+        quantity, _ = self._holds.pop(key)
+        remaining = self._held[key[1]] - quantity
+        if remaining:
+            self._held[key[1]] = remaining
+        else:
+            del self._held[key[1]]
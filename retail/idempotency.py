@@ -0,0 +1,67 @@
+"""Request deduplication by idempotency key."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class KeyReused(Exception):
+    """Raised when a key is replayed with a different request."""
+
+
+class IdempotencyCache:
+    """Bounded TTL cache of results keyed by idempotency key.
+
+    ``run(key, func)`` calls ``func`` once per key and stores its
+    result for ``ttl`` seconds; duplicates get the stored result.
+    A duplicate that arrives while the first request is still running
+    waits for it instead of running ``func`` again.
+
+    When a ``fingerprint`` of the request is given, a duplicate whose
+    fingerprint differs from the stored one raises ``KeyReused`` rather
+    than getting another request's result.
+    """
+
+    def __init__(self, max_entries=10000, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._running = {}
+
+    def run(self, key, func, fingerprint=None):
+        """Return the stored result for key, or run func and store it."""
+        while True:
+            with self._lock:
+                entry = self._results.get(key)
+                if entry is not None:
+                    expires, stored, result = entry
+                    if expires > time.monotonic():
+                        if fingerprint is not None and stored != fingerprint:
+                            raise KeyReused(key)
+                        self.hits += 1
+                        return result
+                    del self._results[key]
+                running = self._running.get(key)
+                if running is None:
+                    running = self._running[key] = threading.Event()
+                    self.misses += 1
+                    break
+            running.wait()
+
+        try:
+            result = func()
+            now = time.monotonic()
+            with self._lock:
+                self._results[key] = (now + self.ttl, fingerprint, result)
+                # Entries share one TTL, so the oldest expire first
+                while self._results and (
+                        len(self._results) > self.max_entries
+                        or next(iter(self._results.values()))[0] <= now):
+                    self._results.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                del self._running[key]
+            running.set()
@@ -0,0 +1,147 @@
+"""Secondary indexes over the catalog for filtered, sorted browsing."""
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+SORTS = ('price', '-price', 'name')
+
+# Changes this small are always applied in place
+_MIN_REBUILD = 64
+
+
+class CatalogIndex:
+    """Price, name and in-stock indexes kept in step with a catalog.
+
+    Keeps every product, and separately the in-stock ones, sorted by
+    price and by name. Stock changes move a product in or out of the
+    in-stock orderings; replacing the catalog rebuilds everything, as
+    does a change to more than ``rebuild_fraction`` of the products,
+    where one sort beats moving them one by one. Price-sorted queries
+    cost O(log n + k) for a page of k products.
+    """
+
+    def __init__(self, catalog, rebuild_fraction=0.05):
+        self.catalog = catalog
+        self.rebuild_fraction = rebuild_fraction
+        self._lock = threading.Lock()
+        self._source = None
+        self._prices = {}
+        self._in_stock = set()
+        self._by_price = []
+        self._in_stock_by_price = []
+        self._by_name = []
+        self._in_stock_by_name = []
+        catalog.subscribe(self.update)
+
+    def in_stock(self):
+        """Return the names (lowercase) of products in stock."""
+        self._ensure()
+        with self._lock:
+            return set(self._in_stock)
+
+    def update(self, names):
+        """Re-index the named products after a catalog change."""
+        if (self._source is not self.catalog.products()
+                or len(names) > max(_MIN_REBUILD,
+                                    self.rebuild_fraction * len(self._prices))):
+            self.rebuild()
+            return
+        with self._lock:
+            for name in names:
+                self._reindex(name.lower(), self.catalog.find(name))
+
+    def rebuild(self):
+        """Rebuild all indexes from the catalog."""
+        products = self.catalog.products()
+        with self._lock:
+            self._source = products
+            self._prices = {p['name'].lower(): p['price'] for p in products}
+            self._in_stock = {p['name'].lower() for p in products
+                              if p['stock'] > 0}
+            self._by_price = sorted((price, name)
+                                    for name, price in self._prices.items())
+            self._in_stock_by_price = [e for e in self._by_price
+                                       if e[1] in self._in_stock]
+            self._by_name = sorted(self._prices)
+            self._in_stock_by_name = sorted(self._in_stock)
+
+    def query(self, min_price=None, max_price=None, in_stock=False,
+              sort='price', offset=0, limit=None):
+        """Return ``(products, total)`` for one page of a filtered listing.
+
+        ``sort`` is one of ``SORTS``; ``total`` counts all matches.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        self._ensure()
+        with self._lock:
+            if sort == 'name' and min_price is None and max_price is None:
+                ordered = (self._in_stock_by_name if in_stock
+                           else self._by_name)
+                total = len(ordered)
+                names = ordered[offset:_end(offset, limit)]
+            else:
+                by_price = (self._in_stock_by_price if in_stock
+                            else self._by_price)
+                lo = 0 if min_price is None else bisect_left(
+                    by_price, min_price, key=_price)
+                hi = len(by_price) if max_price is None else bisect_right(
+                    by_price, max_price, key=_price)
+                hi = max(lo, hi)
+                total = hi - lo
+                if sort == 'price':
+                    start = lo + offset
+                    end = hi if limit is None else min(hi, start + limit)
+                    names = [n for _, n in by_price[start:end]]
+                elif sort == '-price':
+                    end = max(lo, hi - offset)
+                    start = lo if limit is None else max(lo, end - limit)
+                    names = [n for _, n in reversed(by_price[start:end])]
+                else:
+                    # Price range sorted by name: O(m log m) in the range
+                    names = sorted(n for _, n in by_price[lo:hi])
+                    names = names[offset:_end(offset, limit)]
+        products = (self.catalog.find(name) for name in names)
+        return [p for p in products if p is not None], total
+
+    def _ensure(self):
+        if self._source is not self.catalog.products():
+            self.rebuild()
+
+    def _reindex(self, name, product):
+        # Caller holds self._lock
+        old_price = self._prices.get(name)
+        if (product is not None and old_price == product['price']
+                and (name in self._in_stock) == (product['stock'] > 0)):
+            # Stock moved but stayed on the same side of zero
+            return
+        self._prices.pop(name, None)
+        if old_price is not None:
+            _remove(self._by_price, (old_price, name))
+            _remove(self._in_stock_by_price, (old_price, name))
+            _remove(self._by_name, name)
+            _remove(self._in_stock_by_name, name)
+            self._in_stock.discard(name)
+        if product is None:
+            return
+        price = product['price']
+        self._prices[name] = price
+        insort(self._by_price, (price, name))
+        insort(self._by_name, name)
+        if product['stock'] > 0:
+            self._in_stock.add(name)
+            insort(self._in_stock_by_price, (price, name))
+            insort(self._in_stock_by_name, name)
+
+
+def _price(entry):
+    return entry[0]
+
+
+def _end(start, limit):
+    return None if limit is None else start + limit
+
+
+def _remove(ordered, key):
+    i = bisect_left(ordered, key)
+    if i < len(ordered) and ordered[i] == key:
+        del ordered[i]
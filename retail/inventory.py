@@ -0,0 +1,105 @@
+"""Bulk, all-or-nothing stock adjustments."""
+import csv
+import io
+import json
+
+
+def parse_adjustments(text):
+    """Parse adjustments from JSON or CSV text.
+
+    JSON is a list of rows, or an object with an ``adjustments`` list.
+    CSV needs a header with ``name`` and ``stock`` and/or ``delta``
+    columns; empty cells are ignored.
+    """
+    text = text.strip()
+    if text.startswith(('[', '{')):
+        data = json.loads(text)
+        return data['adjustments'] if isinstance(data, dict) else data
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        rows.append({key: value for key, value in row.items()
+                     if value not in (None, '')})
+    return rows
+
+
+def _check(row, current):
+    """Return (name, kind, value, new stock) for a row, or raise ValueError.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    name = row.get('name')
+    if not name or not isinstance(name, str):
+        raise ValueError("Missing product name")
+    if ('stock' in row) == ('delta' in row):
+        raise ValueError("Give exactly one of stock or delta")
+    key = 'stock' if 'stock' in row else 'delta'
+    value = row[key]
+    if isinstance(value, str):
+        try:
+            value = int(value.strip())
+        except ValueError:
+            raise ValueError(f"{key} must be an integer")
+    elif isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{key} must be an integer")
+    if name.lower() not in current:
+        raise ValueError("Product not found")
+    new_stock = value if key == 'stock' else current[name.lower()] + value
+    if new_stock < 0:
+        raise ValueError(f"Stock would become {new_stock}")
+    return name.lower(), key, value, new_stock
+
+
+def apply_adjustments(catalog, rows, apply=None):
+    """Validate a batch of stock updates and apply it as one transaction.
+
+    Each row is ``{'name': ..., 'stock': n}`` (absolute) or
+    ``{'name': ..., 'delta': n}``; rows for the same product apply in
+    order. If any row is invalid nothing is changed. Otherwise every
+    row is applied under one catalog lock with a single change
+    notification, so indexes, caches and persistence are updated once.
+
+    When the stock lives in a shared store, ``apply(changes)`` is called
+    with ``(name, kind, value)`` for each row before the catalog is
+    touched, and returns ``(True, stocks)`` with the authoritative level
+    after each row or ``(False, (index, stock))`` to reject the batch.
+    If it raises, the catalog is left as it was.
+
+    Returns ``(applied, results)`` with one result per row.
+    """
+    with catalog.lock:
+        current = {p['name'].lower(): p['stock'] for p in catalog.products()}
+        results = []
+        changes = []
+        for i, row in enumerate(rows):
+            try:
+                name, kind, value, new_stock = _check(row, current)
+            except ValueError as e:
+                results.append({'row': i, 'status': 'error', 'error': str(e)})
+                continue
+            current[name] = new_stock
+            results.append({'row': i, 'name': catalog.find(name)['name'],
+                            'status': 'ok', 'stock': new_stock})
+            changes.append((results[-1]['name'], kind, value))
+
+        applied = all(r['status'] == 'ok' for r in results)
+        if applied and apply is not None:
+            applied, outcome = apply(changes)
+            if applied:
+                for result, stock in zip(results, outcome):
+                    result['stock'] = stock
+            else:
+                index, stock = outcome
+                results[index] = {'row': index, 'status': 'error',
+                                  'error': f"Stock would become {stock}"}
+        if not applied:
+            for result in results:
+                if result['status'] == 'ok':
+                    result['status'] = 'not applied'
+            return False, results
+
+        levels = {}
+        for result in results:
+            catalog.find(result['name'])['stock'] = result['stock']
+            levels[result['name']] = result['stock']
+    catalog.changed(list(levels))
+    return True, results
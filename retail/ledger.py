@@ -0,0 +1,238 @@
+"""Order ledger persisted through a group-commit writer."""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks; only one process may use a journal
+    fcntl = None
+
+
+class LedgerClosedError(RuntimeError):
+    """Raised when appending to a writer that has been closed."""
+
+
+class JournalLocked(OSError):
+    """Raised when another process already has a journal open."""
+
+
+class GroupCommitWriter:
+    """Append JSON records to a file, batching concurrent writers.
+
+    Records submitted while a batch window is open are written with a
+    single ``write`` + ``fsync``. A window closes as soon as it holds
+    ``max_batch`` records or ``max_latency`` seconds have passed since
+    its first record arrived. ``append`` returns only once the batch
+    holding its record is durable on disk.
+    """
+
+    def __init__(self, path, max_batch=64, max_latency=0.005):
+        self.path = Path(path)
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.batches = 0
+        self.records = 0
+        self._cond = threading.Condition()
+        self._pending = []
+        self._closed = False
+        self._thread = None
+        self._file = None
+
+    def append(self, record, timeout=None):
+        """Append a record and block until it has been fsynced."""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise LedgerClosedError("Ledger writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='ledger-writer', daemon=True)
+                self._thread.start()
+            self._pending.append((line, future))
+            self._cond.notify_all()
+        return future.result(timeout)
+
+    def close(self):
+        """Flush outstanding records and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _next_batch(self):
+        """Wait for a batch window to fill or expire and take it."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = time.monotonic() + self.max_latency
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                try:
+                    self._write(''.join(line for line, _ in batch))
+                except OSError as exc:
+                    for _, future in batch:
+                        future.set_exception(exc)
+                    continue
+                self.batches += 1
+                self.records += len(batch)
+                for _, future in batch:
+                    future.set_result(None)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, data):
+        if self._file is None:
+            os.makedirs(self.path.parent, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+class OrderLedger:
+    """Durable, append-only record of completed orders."""
+
+    def __init__(self, path, max_batch=64, max_latency=0.005):
+        self.path = Path(path)
+        self._writer = GroupCommitWriter(path, max_batch=max_batch,
+                                         max_latency=max_latency)
+
+    def record(self, cart, store_id=None, order_id=None):
+        """Record an order for the given cart items and return it.
+
+        Returns once the order is durable on disk.
+        """
+        items = [
+            {
+                'name': item['name'],
+                'price': item['price'],
+                'quantity': item['quantity'],
+                'subtotal': round(item['price'] * item['quantity'], 2)
+            }
+            for item in cart
+        ]
+        order = {
+            'order_id': order_id or uuid.uuid4().hex,
+            'items': items,
+            'total': round(sum(item['subtotal'] for item in items), 2),
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        if store_id is not None:
+            order['store_id'] = store_id
+        self._writer.append(order)
+        return order
+
+    def orders(self):
+        """Read back all recorded orders."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def close(self):
+        """Flush outstanding orders and stop the writer."""
+        self._writer.close()
+
+
+class OrderJournal:
+    """Durable log of accepted orders and their progress.
+
+    ``append`` returns once its record is fsynced. Records are
+    ``{'order': {...}}`` when an order is accepted, ``{'order_id': ...,
+    'stage': name}`` when a stage completes and ``{'order_id': ...,
+    'status': ...}`` when the order finishes.
+
+    A journal belongs to one pipeline at a time: opening one that another
+    process holds raises ``JournalLocked``.
+    """
+
+    def __init__(self, path, max_batch=64, max_latency=0.005):
+        self.path = Path(path)
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._lock_file = open(self.path.with_name(self.path.name + '.lock'),
+                               'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise JournalLocked(f"{self.path} is in use")
+        self._writer = GroupCommitWriter(path, max_batch=max_batch,
+                                         max_latency=max_latency)
+
+    def append(self, record):
+        """Append a record; returns once it is durable on disk."""
+        self._writer.append(record)
+
+    def recover(self):
+        """Return ``(order, stages done)`` for every unfinished order.
+
+        The journal is rewritten to hold only those orders, so it does
+        not grow without bound. Call before the first ``append``.
+        """
+        unfinished = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-write
+                continue
+            if 'order' in record:
+                unfinished[record['order']['order_id']] = (record['order'],
+                                                           [])
+            elif record.get('order_id') in unfinished:
+                if 'status' in record:
+                    del unfinished[record['order_id']]
+                else:
+                    unfinished[record['order_id']][1].append(record['stage'])
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for order, done in unfinished.values():
+                f.write(json.dumps({'order': order}, separators=(',', ':'))
+                        + '\n')
+                for stage in done:
+                    f.write(json.dumps({'order_id': order['order_id'],
+                                        'stage': stage},
+                                       separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return list(unfinished.values())
+
+    def close(self):
+        """Flush outstanding records, stop the writer and unlock."""
+        self._writer.close()
+        self._lock_file.close()
@@ -0,0 +1,213 @@
+"""Asynchronous order processing on a bounded worker pool."""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+QUEUED = 'queued'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+class OrderRejected(Exception):
+    """Raised by a stage when an order cannot succeed; not retried."""
+
+
+class QueueFull(Exception):
+    """Raised when no more orders can be accepted right now."""
+
+
+class OrderPipeline:
+    """Accept orders immediately and process them in the background.
+
+    ``submit`` only queues the order and returns its id. ``workers``
+    threads take orders off a queue of at most ``max_queue`` and run
+    them through ``stages``, a list of ``(name, func)`` called as
+    ``func(order)`` in order. A stage raising ``OrderRejected`` fails
+    the order; any other exception is retried up to ``retries`` times
+    with exponential backoff, resuming at the stage that failed.
+    ``on_failed(order, done)`` is called with the names of the stages
+    that had completed, so their effects can be undone. Errors raised by
+    the callbacks are logged; they never stop a worker.
+
+    With a ``journal`` (an ``OrderJournal``), ``submit`` returns only
+    once the order is durable, and stage completions and outcomes are
+    journaled too. Orders left unfinished by a crash are queued again on
+    start and resume after their last journaled stage; a stage that was
+    interrupted runs again, with ``recovered`` set on the order.
+
+    The status of the last ``max_orders`` orders is kept for polling.
+    """
+
+    def __init__(self, stages, workers=4, max_queue=1000, retries=3,
+                 backoff=0.1, max_orders=10000, on_failed=None,
+                 on_finished=None, journal=None):
+        self.stages = list(stages)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_orders = max_orders
+        self.on_failed = on_failed
+        self.on_finished = on_finished
+        self.journal = journal
+        self.retried = 0
+        self._lock = threading.Lock()
+        self._orders = OrderedDict()
+        self._queue = queue.Queue(max_queue)
+        self._threads = [threading.Thread(target=self._run, daemon=True,
+                                          name=f'order-worker-{i}')
+                         for i in range(workers)]
+        recovered = journal.recover() if journal is not None else []
+        for thread in self._threads:
+            thread.start()
+        for order, done in recovered:
+            order.update(status=QUEUED, recovered=True)
+            with self._lock:
+                self._orders[order['order_id']] = order
+            # Blocks while the queue is full; the workers are running
+            self._queue.put((order, done))
+
+    def submit(self, payload):
+        """Queue an order built from payload and return its id."""
+        now = _now()
+        order = dict(payload, order_id=uuid.uuid4().hex, status=QUEUED,
+                     stage=None, attempts=0, message=None,
+                     created_at=now, updated_at=now)
+        with self._lock:
+            self._orders[order['order_id']] = order
+            self._trim()
+        try:
+            if self.journal is not None:
+                self.journal.append({'order': order})
+            self._queue.put_nowait((order, []))
+        except queue.Full:
+            self._forget(order, FAILED)
+            raise QueueFull("Too many orders in progress")
+        except Exception:
+            self._forget(order, None)
+            raise
+        return order['order_id']
+
+    def status(self, order_id):
+        """Return a copy of an order's current state, or None."""
+        with self._lock:
+            order = self._orders.get(order_id)
+            return dict(order) if order is not None else None
+
+    def stats(self):
+        """Return counts of orders by status, queue depth and retries."""
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, PROCESSING, COMPLETED, FAILED), 0)
+            for order in self._orders.values():
+                counts[order['status']] += 1
+        return dict(counts, queue_depth=self._queue.qsize(),
+                    retried=self.retried)
+
+    def close(self):
+        """Finish queued orders, stop the workers and close the journal."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            order, done = item
+            try:
+                self._process(order, done)
+            except Exception:
+                logger.exception("Error processing order %s",
+                                 order['order_id'])
+                self._update(order, status=FAILED, message="An unexpected "
+                             "error occurred during checkout")
+
+    def _process(self, order, done):
+        done = list(done)
+        for name, func in self.stages:
+            if name in done:
+                continue
+            for attempt in range(self.retries + 1):
+                self._update(order, status=PROCESSING, stage=name,
+                             attempts=order['attempts'] + 1)
+                try:
+                    func(order)
+                    break
+                except OrderRejected as e:
+                    self._fail(order, done, str(e))
+                    return
+                except Exception:
+                    if attempt == self.retries:
+                        self._fail(order, done, "An unexpected error "
+                                                "occurred during checkout")
+                        return
+                    self.retried += 1
+                    time.sleep(self.backoff * 2 ** attempt)
+            done.append(name)
+            self._journal({'order_id': order['order_id'], 'stage': name})
+        self._update(order, status=COMPLETED, stage=None,
+                     message="Thank you for your purchase!")
+        self._finish(order)
+
+    def _fail(self, order, done, message):
+        if self.on_failed is not None:
+            try:
+                self.on_failed(order, done)
+            except Exception:
+                logger.exception("Error undoing stages %s of order %s",
+                                 done, order['order_id'])
+        self._update(order, status=FAILED, message=message)
+        self._finish(order)
+
+    def _finish(self, order):
+        self._journal({'order_id': order['order_id'],
+                       'status': order['status']})
+        if self.on_finished is not None:
+            try:
+                self.on_finished(self.status(order['order_id']))
+            except Exception:
+                logger.exception("Error reporting order %s",
+                                 order['order_id'])
+
+    def _journal(self, record):
+        # A lost progress record only means a stage may rerun on recovery
+        if self.journal is not None:
+            try:
+                self.journal.append(record)
+            except Exception:
+                logger.exception("Error journaling order %s",
+                                 record['order_id'])
+
+    def _forget(self, order, status):
+        # Drop an order that never made it onto the queue
+        with self._lock:
+            del self._orders[order['order_id']]
+        if status is not None:
+            self._journal({'order_id': order['order_id'], 'status': status})
+
+    def _update(self, order, **fields):
+        with self._lock:
+            order.update(fields, updated_at=_now())
+
+    def _trim(self):
+        # Caller holds self._lock; forget the oldest finished orders
+        excess = len(self._orders) - self.max_orders
+        for order_id in list(self._orders):
+            if excess <= 0:
+                break
+            if self._orders[order_id]['status'] in (COMPLETED, FAILED):
+                del self._orders[order_id]
+                excess -= 1
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,47 @@
+"""Short-lived cache of rendered pages."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class PageCache:
+    """Bounded micro-cache of rendered pages.
+
+    An entry is served until ``ttl`` seconds have passed or the version
+    it was rendered at (e.g. the catalog version) changes, whichever
+    comes first.
+    """
+
+    def __init__(self, ttl=2.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        """Return the cached page for key at version, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or entry[1] != version
+                    or entry[0] <= time.monotonic()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, version, page):
+        """Cache a page rendered at version."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, page)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return hit and miss counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries)}
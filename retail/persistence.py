@@ -0,0 +1,92 @@
+"""Write-behind persistence for in-memory state."""
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """Coalesce dirty keys and flush them from a background thread.
+
+    ``mark_dirty`` only records keys in memory. A background thread
+    calls ``flush(keys)`` once ``interval`` seconds have passed since
+    the first pending key, or as soon as ``max_dirty`` keys are
+    pending, so a burst of mutations collapses into a few writes.
+    ``close()`` forces a final flush.
+    """
+
+    def __init__(self, flush, interval=0.5, max_dirty=100):
+        self._flush = flush
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.marks = 0
+        self.flushes = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._dirty = set()
+        self._first_dirty = None
+        self._closed = False
+        self._thread = None
+
+    def mark_dirty(self, keys):
+        """Record keys as needing to be persisted."""
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(
+                    target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+            if not self._dirty:
+                self._first_dirty = time.monotonic()
+            self._dirty.update(keys)
+            self.marks += 1
+            if len(self._dirty) >= self.max_dirty or len(self._dirty) == 1:
+                self._cond.notify_all()
+
+    def pending(self):
+        """Return the number of keys waiting to be flushed."""
+        with self._cond:
+            return len(self._dirty)
+
+    def flush(self):
+        """Synchronously flush any pending keys."""
+        with self._flush_lock:
+            with self._cond:
+                keys, self._dirty = self._dirty, set()
+            if not keys:
+                return
+            try:
+                self._flush(keys)
+            except Exception:
+                # Keep the keys dirty so the next flush retries them
+                with self._cond:
+                    if not self._dirty:
+                        self._first_dirty = time.monotonic()
+                    self._dirty.update(keys)
+                raise
+            self.flushes += 1
+
+    def close(self):
+        """Stop the background thread after a final forced flush."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                while not self._closed and len(self._dirty) < self.max_dirty:
+                    remaining = (self._first_dirty + self.interval
+                                 - time.monotonic())
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except OSError:
+                time.sleep(self.interval)
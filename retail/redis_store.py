@@ -0,0 +1,319 @@
+"""Shared cart and stock store speaking the Redis protocol (RESP)."""
+import hashlib
+import json
+import queue
+import socket
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Check every item, then decrement them all and delete the cart, in one
+# atomic server-side step. KEYS: stock hash, cart key, order marker; the
+# last two may be ''. ARGV: name, quantity pairs. Returns {1, name,
+# stock, ...} with the new stock levels, or {0, name, stock} for the
+# first item that is short. Items missing from the stock hash are
+# skipped. An order whose marker exists was applied already: its
+# current levels are returned and nothing changes. Markers last a week.
+RESERVE_SCRIPT = """
+if KEYS[3] ~= '' and redis.call('EXISTS', KEYS[3]) == 1 then
+  local result = {1}
+  for i = 1, #ARGV, 2 do
+    local stock = redis.call('HGET', KEYS[1], ARGV[i])
+    if stock then
+      table.insert(result, ARGV[i])
+      table.insert(result, tonumber(stock))
+    end
+  end
+  return result
+end
+for i = 1, #ARGV, 2 do
+  local stock = redis.call('HGET', KEYS[1], ARGV[i])
+  if stock and tonumber(stock) < tonumber(ARGV[i + 1]) then
+    return {0, ARGV[i], tonumber(stock)}
+  end
+end
+local result = {1}
+for i = 1, #ARGV, 2 do
+  if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+    local stock = redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1]))
+    table.insert(result, ARGV[i])
+    table.insert(result, stock)
+  end
+end
+if KEYS[2] ~= '' then
+  redis.call('DEL', KEYS[2])
+end
+if KEYS[3] ~= '' then
+  redis.call('SET', KEYS[3], 1, 'EX', 604800)
+end
+return result
+"""
+
+# Apply stock changes in order, in one atomic server-side step, so deltas
+# land on the current level even while checkouts run. KEYS: stock hash.
+# ARGV: name, 'stock' or 'delta', value triples. Returns {1, stock, ...}
+# with the level after each change, or {0, index, stock} for the first
+# change that would make stock negative, in which case nothing is set.
+ADJUST_SCRIPT = """
+local levels = {}
+local result = {1}
+for i = 1, #ARGV, 3 do
+  local stock = levels[ARGV[i]]
+  if stock == nil then
+    stock = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+  end
+  if ARGV[i + 1] == 'delta' then
+    stock = stock + tonumber(ARGV[i + 2])
+  else
+    stock = tonumber(ARGV[i + 2])
+  end
+  if stock < 0 then
+    return {0, (i - 1) / 3, stock}
+  end
+  levels[ARGV[i]] = stock
+  table.insert(result, stock)
+end
+for name, stock in pairs(levels) do
+  redis.call('HSET', KEYS[1], name, stock)
+end
+return result
+"""
+
+
+class RedisError(Exception):
+    """Raised for error replies from the server."""
+
+
+def encode_command(*args):
+    """Encode a command as a RESP array of bulk strings."""
+    out = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(out)
+
+
+def read_reply(reader):
+    """Read one RESP reply from a binary file-like object."""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        return RedisError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisConnection:
+    """A single connection to a RESP server."""
+
+    def __init__(self, host, port, db=0, timeout=5.0):
+        self._sock = socket.create_connection((host, port), timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    def pipeline(self, commands):
+        """Send commands in one write and read all replies.
+
+        Error replies are returned in place rather than raised.
+        """
+        self._sock.sendall(b''.join(encode_command(*c) for c in commands))
+        return [read_reply(self._reader) for _ in commands]
+
+    def execute(self, *args):
+        """Run a single command and return its reply."""
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self):
+        """Close the connection."""
+        self._reader.close()
+        self._sock.close()
+
+
+class RedisPool:
+    """Bounded pool of connections to one server."""
+
+    def __init__(self, host='localhost', port=6379, db=0, max_connections=16,
+                 timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(max_connections):
+            self._slots.put(None)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Create a pool from a redis://host:port/db URL."""
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or 'localhost', parsed.port or 6379, db,
+                   **kwargs)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, waiting if the pool is exhausted."""
+        self._slots.get(timeout=self.timeout)
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = RedisConnection(self.host, self.port, self.db,
+                                       self.timeout)
+            try:
+                yield conn
+            except OSError:
+                # The connection may be half-read; don't reuse it
+                conn.close()
+                raise
+            except BaseException:
+                self._idle.put(conn)
+                raise
+            self._idle.put(conn)
+        finally:
+            self._slots.put(None)
+
+    def close(self):
+        """Close idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RedisStore:
+    """Carts and stock counters kept in a shared Redis-protocol server."""
+
+    def __init__(self, pool, prefix='retail:', cart_ttl=7 * 24 * 3600):
+        self.pool = pool
+        self.prefix = prefix
+        self.cart_ttl = cart_ttl
+        self.stock_key = prefix + 'stock'
+        self._shas = {script: hashlib.sha1(script.encode()).hexdigest()
+                      for script in (RESERVE_SCRIPT, ADJUST_SCRIPT)}
+
+    def cart_key(self, cart_id):
+        """Return the key holding a cart."""
+        return f'{self.prefix}cart:{cart_id}'
+
+    def order_key(self, order_id):
+        """Return the key marking an order's stock as taken."""
+        return f'{self.prefix}order:{order_id}'
+
+    def seed_stock(self, products):
+        """Set stock counters that do not exist yet, in one round trip."""
+        with self.pool.connection() as conn:
+            conn.pipeline([('HSETNX', self.stock_key, product['name'],
+                            product['stock']) for product in products])
+
+    def stock_levels(self):
+        """Return all stock counters as a dict."""
+        with self.pool.connection() as conn:
+            reply = conn.execute('HGETALL', self.stock_key)
+        return {reply[i].decode(): int(reply[i + 1])
+                for i in range(0, len(reply), 2)}
+
+    def set_stock(self, levels):
+        """Set absolute stock levels."""
+        if not levels:
+            return
+        args = [arg for name, stock in levels.items() for arg in (name, stock)]
+        with self.pool.connection() as conn:
+            conn.execute('HSET', self.stock_key, *args)
+
+    def get_cart(self, cart_id):
+        """Return the items in a cart."""
+        with self.pool.connection() as conn:
+            data = conn.execute('GET', self.cart_key(cart_id))
+        return json.loads(data) if data else []
+
+    def save_cart(self, cart_id, cart):
+        """Store a cart, or delete it when empty."""
+        with self.pool.connection() as conn:
+            if cart:
+                conn.execute('SET', self.cart_key(cart_id), json.dumps(cart),
+                             'EX', self.cart_ttl)
+            else:
+                conn.execute('DEL', self.cart_key(cart_id))
+
+    def reserve(self, items, cart_id=None, order_id=None):
+        """Atomically decrement stock for all items, or none of them.
+
+        When ``cart_id`` is given the cart is deleted in the same step.
+        With an ``order_id`` stock is taken at most once per order; a
+        repeat returns the current levels without changing them.
+        Returns ``(True, new_levels)`` or ``(False, message)``; normally
+        costs one round trip (a checkout also reads the cart first).
+        """
+        keys = [self.stock_key,
+                self.cart_key(cart_id) if cart_id is not None else '',
+                self.order_key(order_id) if order_id is not None else '']
+        args = [arg for item in items
+                for arg in (item['name'], item['quantity'])]
+        reply = self._eval(RESERVE_SCRIPT, keys, args)
+        if reply[0] == 0:
+            name, stock = reply[1].decode(), reply[2]
+            return False, f"{name} is out of stock. Only {stock} available."
+        return True, {reply[i].decode(): reply[i + 1]
+                      for i in range(1, len(reply), 2)}
+
+    def adjust(self, changes):
+        """Atomically apply ``(name, kind, value)`` stock changes in order.
+
+        ``kind`` is ``'stock'`` for an absolute level or ``'delta'``.
+        Deltas apply to the level in the store, so checkouts made since
+        it was read are not lost. Returns ``(True, stocks)`` with the
+        level after each change, or ``(False, (index, stock))`` for the
+        first change that would make stock negative; nothing is changed
+        then.
+        """
+        args = [arg for change in changes for arg in change]
+        reply = self._eval(ADJUST_SCRIPT, [self.stock_key], args)
+        if reply[0] == 0:
+            return False, (reply[1], reply[2])
+        return True, reply[1:]
+
+    def release(self, items, order_id=None):
+        """Return previously reserved stock, in one round trip."""
+        commands = [('HINCRBY', self.stock_key, item['name'],
+                     item['quantity']) for item in items]
+        if order_id is not None:
+            commands.append(('DEL', self.order_key(order_id)))
+        with self.pool.connection() as conn:
+            conn.pipeline(commands)
+
+    def _eval(self, script, keys, args):
+        # EVALSHA, loading the script with EVAL if the server lacks it
+        with self.pool.connection() as conn:
+            reply = conn.pipeline([('EVALSHA', self._shas[script], len(keys),
+                                    *keys, *args)])[0]
+            if isinstance(reply, RedisError) and str(reply).startswith(
+                    'NOSCRIPT'):
+                reply = conn.pipeline(
+                    [('EVAL', script, len(keys), *keys, *args)])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
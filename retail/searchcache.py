@@ -0,0 +1,108 @@
+"""Search result cache with negative caching."""
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize(query):
+    """Normalise a search query: case-folded, whitespace collapsed."""
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """LRU cache of search results for one catalog version.
+
+    ``run(query, version, func)`` returns the cached result for the
+    normalised query or calls ``func(normalised)`` and caches what it
+    returns. Queries with no result (None) go to a separate negative
+    cache, so a flood of misspelt queries cannot evict popular results.
+    Everything cached is dropped as soon as a different catalog version
+    is seen.
+    """
+
+    def __init__(self, max_entries=1024, max_negative=4096):
+        self.max_entries = max_entries
+        self.max_negative = max_negative
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._results = OrderedDict()
+        self._negative = OrderedDict()
+        # Count, total and max seconds, by outcome
+        self._latency = {'hit': [0, 0.0, 0.0], 'miss': [0, 0.0, 0.0]}
+
+    def run(self, query, version, func):
+        """Return the result for query at catalog version."""
+        started = time.perf_counter()
+        key = normalize(query)
+        with self._lock:
+            # False when a newer version has been seen already
+            current = self._check_version(version)
+            if current and key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                result = self._results[key]
+                self._observe('hit', started)
+                return result
+            if current and key in self._negative:
+                self._negative.move_to_end(key)
+                self.negative_hits += 1
+                self._observe('hit', started)
+                return None
+            self.misses += 1
+
+        result = func(key)
+        with self._lock:
+            # Don't cache a result computed against an older catalog
+            if current and self._version == version:
+                entries, limit = ((self._results, self.max_entries)
+                                  if result is not None
+                                  else (self._negative, self.max_negative))
+                entries[key] = result
+                entries.move_to_end(key)
+                while len(entries) > limit:
+                    entries.popitem(last=False)
+            self._observe('miss', started)
+        return result
+
+    def stats(self):
+        """Return hit ratio, sizes and lookup latency by outcome."""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            latency = {
+                outcome: {'count': count,
+                          'avg_ms': round(total / count * 1000, 3)
+                          if count else 0.0,
+                          'max_ms': round(worst * 1000, 3)}
+                for outcome, (count, total, worst) in self._latency.items()}
+            return {'hits': self.hits, 'negative_hits': self.negative_hits,
+                    'misses': self.misses,
+                    'hit_ratio': round((lookups - self.misses) / lookups, 4)
+                    if lookups else 0.0,
+                    'entries': len(self._results),
+                    'negative_entries': len(self._negative),
+                    'invalidations': self.invalidations,
+                    'latency': latency}
+
+    def _check_version(self, version):
+        # Caller holds self._lock; versions only move forward
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._results or self._negative:
+                self.invalidations += 1
+            self._results.clear()
+            self._negative.clear()
+            self._version = version
+        return True
+
+    def _observe(self, outcome, started):
+        # Caller holds self._lock
+        elapsed = time.perf_counter() - started
+        stats = self._latency[outcome]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
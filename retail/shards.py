@@ -0,0 +1,127 @@
+"""Catalog shards: an independent catalog stack per storefront."""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from retail.catalog import Catalog
+from retail.combining import StockCombiner
+from retail.events import Broadcaster
+from retail.holds import StockHolds
+from retail.indexes import CatalogIndex
+from retail.persistence import WriteBehindQueue
+from retail.searchcache import SearchCache
+
+STORE_ID = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+
+class Shard:
+    """One store's catalog with its own file, lock, index and caches.
+
+    Nothing is shared between shards, so stock changes in one store never
+    wait on another store's lock, index or file writes.
+    """
+
+    def __init__(self, store_id, path, defaults=(), flush_interval=0.5,
+                 max_dirty=100, hot_threshold=None, window=1.0,
+                 hold_ttl=900.0, hold_tick=1.0, search_cache_size=1024,
+                 search_negative_size=4096, max_streams=32, holds=True):
+        self.store_id = store_id
+        self.catalog = Catalog(path, defaults=defaults)
+        self.persistence = WriteBehindQueue(self.catalog.write,
+                                            interval=flush_interval,
+                                            max_dirty=max_dirty)
+        self.catalog.subscribe(self.persistence.mark_dirty)
+        self.stock = StockCombiner(self.catalog, hot_threshold=hot_threshold,
+                                   window=window)
+        self.index = CatalogIndex(self.catalog)
+        # None when add-to-cart holds are disabled
+        self.holds = (StockHolds(ttl=hold_ttl, tick=hold_tick)
+                      if holds else None)
+        self.events = Broadcaster(max_streams=max_streams)
+        self.searches = SearchCache(max_entries=search_cache_size,
+                                    max_negative=search_negative_size)
+        # Shared stock store and file watcher, attached by the app
+        self.store = None
+        self.watcher = None
+
+    def load(self):
+        """Load the catalog and build its indexes."""
+        self.catalog.products()
+        self.index.rebuild()
+        return self
+
+    def stats(self):
+        """Return catalog size, version and pending work for the shard."""
+        return {'products': len(self.catalog.products()),
+                'version': self.catalog.version,
+                'pending_writes': self.persistence.pending(),
+                'combining': self.stock.stats(),
+                'holds': (self.holds.stats()
+                          if self.holds is not None else None),
+                'search_cache': self.searches.stats()}
+
+    def close(self):
+        """Stop watching and flush pending catalog writes."""
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.persistence.close()
+
+
+class ShardRouter:
+    """Route store ids to shards, creating each on first use.
+
+    ``factory(store_id)`` builds a shard. Only ids in ``store_ids`` are
+    served, or any well-formed id when it is None; anything else raises
+    KeyError. ``default`` is the store for requests that name none; when
+    it is not served the first of ``store_ids`` is used instead.
+    Malformed ids raise ValueError here rather than failing every request.
+    """
+
+    def __init__(self, factory, store_ids=None, default=None):
+        self.factory = factory
+        self.store_ids = None if store_ids is None else set(store_ids)
+        if store_ids and default not in self.store_ids:
+            default = list(store_ids)[0]
+        for store_id in sorted(self.store_ids or ()) + [default]:
+            if store_id is not None and not (
+                    isinstance(store_id, str) and STORE_ID.fullmatch(store_id)):
+                raise ValueError(f"Invalid store id: {store_id!r}")
+        self.default = default
+        self._lock = threading.Lock()
+        self._shards = {}
+
+    def get(self, store_id):
+        """Return the shard for a store."""
+        shard = self._shards.get(store_id)
+        if shard is not None:
+            return shard
+        if (not isinstance(store_id, str) or not STORE_ID.fullmatch(store_id)
+                or (self.store_ids is not None
+                    and store_id not in self.store_ids)):
+            raise KeyError(store_id)
+        with self._lock:
+            if store_id not in self._shards:
+                self._shards[store_id] = self.factory(store_id)
+            return self._shards[store_id]
+
+    def shards(self):
+        """Return the shards created so far."""
+        return list(self._shards.values())
+
+    def load(self, store_ids, max_workers=8):
+        """Create and load the given stores' shards in parallel."""
+        store_ids = list(store_ids)
+        if not store_ids:
+            return []
+        with ThreadPoolExecutor(min(max_workers, len(store_ids)),
+                                thread_name_prefix='shard-load') as pool:
+            return list(pool.map(lambda s: self.get(s).load(), store_ids))
+
+    def stats(self):
+        """Return the stats of every shard, by store id."""
+        return {shard.store_id: shard.stats() for shard in self.shards()}
+
+    def close(self):
+        """Close every shard."""
+        for shard in self.shards():
+            shard.close()
@@ -1,3 +1,32 @@
+// Live stock updates: patch product cards in place from the SSE stream
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.EventSource || !document.querySelector('[data-sku]')) {
+        return;
+    }
+
+    const events = new EventSource('/events/stock');
+    // A resync carries every product's stock; apply it like a change
+    const patch = function(e) {
+        JSON.parse(e.data).forEach(change => {
+            document.querySelectorAll('[data-sku]').forEach(card => {
+                if (card.dataset.sku !== change.sku) {
+                    return;
+                }
+                const stock = card.querySelector('.stock');
+                if (stock) {
+                    stock.textContent = change.stock;
+                }
+                const quantity = card.querySelector('input[name="quantity"]');
+                if (quantity) {
+                    quantity.max = change.stock;
+                }
+            });
+        });
+    };
+    events.addEventListener('stock', patch);
+    events.addEventListener('resync', patch);
+});
+
 document.addEventListener('DOMContentLoaded', function() {
     const searchForm = document.getElementById('search-form');
     const productResults = document.getElementById('product-results');
@@ -6,6 +35,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const checkoutButton = document.getElementById('checkout-button');
     const messageContainer = document.getElementById('message-container');
     const emptyCartMessage = document.getElementById('empty-cart-message');
+
+    // Only pages built around the JSON product results use this script
+    if (!productResults) {
+        return;
+    }
     
     let cart = [];
     
@@ -0,0 +1,131 @@
+"""Hierarchical timer wheel for cheap expiry of many timers."""
+import math
+
+
+class Timer:
+    """A scheduled callback; cancel it with ``HierarchicalTimerWheel.cancel``."""
+
+    __slots__ = ('deadline', 'callback', '_slot')
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self._slot = None
+
+
+class HierarchicalTimerWheel:
+    """Timers bucketed into wheels of increasing granularity.
+
+    Level 0 has ``size`` slots of one tick each, level 1 has ``size``
+    slots of ``size`` ticks each, and so on. A timer sits at the lowest
+    level whose range still covers its deadline and cascades down a
+    level each time the wheel above it turns over, so scheduling,
+    cancelling and expiring a timer are O(1) amortised and no operation
+    ever scans the pending timers.
+
+    Time only moves when ``advance(now)`` is called, which fires every
+    timer that has come due. It jumps straight over ticks where nothing
+    fires or cascades, so a call after a long idle spell costs about as
+    much as the timers it has to move.
+    """
+
+    def __init__(self, tick=1.0, size=64, levels=4, now=0.0):
+        self.tick = tick
+        self.size = size
+        self.levels = levels
+        self.pending = 0
+        self._origin = now
+        self._current = 0
+        self._wheels = [[set() for _ in range(size)] for _ in range(levels)]
+        self._overflow = set()
+        self._due = set()
+
+    def schedule(self, when, callback):
+        """Call ``callback()`` once time ``when`` has been reached."""
+        deadline = math.ceil((when - self._origin) / self.tick)
+        timer = Timer(deadline, callback)
+        self._place(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a timer that has not fired yet."""
+        if timer._slot is not None:
+            timer._slot.discard(timer)
+            timer._slot = None
+            self.pending -= 1
+
+    def advance(self, now):
+        """Move time forward to now and fire every timer that is due."""
+        target = math.floor((now - self._origin) / self.tick)
+        fired = self._fire(self._due)
+        while self._current < target:
+            if not self.pending:
+                self._current = target
+                break
+            self._current = self._next_tick(target)
+            self._cascade()
+            fired += self._fire(self._due)
+            fired += self._fire(self._wheels[0][self._current % self.size])
+        return fired
+
+    def _next_tick(self, limit):
+        # The first tick after the current one, up to limit, at which a
+        # timer fires or cascades. A level only holds timers due later in
+        # its current turn, so once that is empty the next event is on
+        # the level above.
+        span = 1
+        for level in range(self.levels):
+            turn_end = (self._current // (span * self.size) + 1) * self.size
+            for n in range(self._current // span + 1, turn_end):
+                if n * span > limit:
+                    return limit
+                if self._wheels[level][n % self.size]:
+                    return n * span
+            span *= self.size
+        if self._overflow:
+            return min(limit, (self._current // span + 1) * span)
+        return limit
+
+    def _place(self, timer):
+        if timer.deadline <= self._current:
+            slot = self._due
+        else:
+            slot = self._overflow
+            span = 1
+            for level in range(self.levels):
+                # The timer belongs to the lowest level above which its
+                # deadline and the current tick agree
+                if (timer.deadline // (span * self.size)
+                        == self._current // (span * self.size)):
+                    slot = self._wheels[level][
+                        (timer.deadline // span) % self.size]
+                    break
+                span *= self.size
+        slot.add(timer)
+        timer._slot = slot
+
+    def _cascade(self):
+        # Highest level first so timers can drop more than one level
+        if self._current % self.size ** self.levels == 0:
+            self._replace(self._overflow)
+        for level in range(self.levels - 1, 0, -1):
+            span = self.size ** level
+            if self._current % span == 0:
+                self._replace(
+                    self._wheels[level][(self._current // span) % self.size])
+
+    def _replace(self, slot):
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def _fire(self, slot):
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            timer._slot = None
+            self.pending -= 1
+            timer.callback()
+        return len(timers)
@@ -0,0 +1,147 @@
+"""Watch a data file for changes made outside the app."""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+_EVENT = struct.Struct('iIII')
+
+logger = logging.getLogger(__name__)
+
+
+class _Watcher(ABC):
+    """Base for watchers that call back once per burst of changes."""
+
+    def __init__(self, folder, filename, callback, debounce=0.2):
+        self.folder = Path(folder)
+        self.filename = filename
+        self.callback = callback
+        self.debounce = debounce
+        self.reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start watching in a background thread."""
+        self._thread = threading.Thread(target=self._run,
+                                        name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _fire(self):
+        self.reloads += 1
+        try:
+            self.callback()
+        except Exception:
+            logger.exception("Error reloading %s", self.folder / self.filename)
+
+    @abstractmethod
+    def _run(self):
+        """Watch until stopped, calling ``_fire`` after each burst."""
+
+
+class InotifyWatcher(_Watcher):
+    """Watch a file with Linux inotify."""
+
+    def __init__(self, folder, filename, callback, debounce=0.2):
+        super().__init__(folder, filename, callback, debounce)
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(self.folder),
+                                  mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def _run(self):
+        name = os.fsencode(self.filename)
+        deadline = None
+        try:
+            while not self._stop.is_set():
+                timeout = 0.5
+                if deadline is not None:
+                    timeout = max(0.0, deadline - time.monotonic())
+                readable, _, _ = select.select([self._fd], [], [], timeout)
+                if readable and name in self._names(os.read(self._fd, 65536)):
+                    # Wait for the burst of events to settle
+                    deadline = time.monotonic() + self.debounce
+                elif deadline is not None and time.monotonic() >= deadline:
+                    deadline = None
+                    self._fire()
+        finally:
+            os.close(self._fd)
+
+    @staticmethod
+    def _names(data):
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            names.add(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+        return names
+
+
+class PollingWatcher(_Watcher):
+    """Watch a file by polling its modification time and size."""
+
+    def __init__(self, folder, filename, callback, debounce=0.2,
+                 interval=1.0):
+        super().__init__(folder, filename, callback, debounce)
+        self.interval = interval
+
+    def _stat(self):
+        try:
+            st = os.stat(self.folder / self.filename)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _run(self):
+        last = self._stat()
+        while not self._stop.wait(self.interval):
+            current = self._stat()
+            if current == last:
+                continue
+            # Wait for the burst of writes to settle
+            while not self._stop.wait(self.debounce):
+                settled = self._stat()
+                if settled == current:
+                    break
+                current = settled
+            last = current
+            self._fire()
+
+
+def watch(folder, filename, callback, debounce=0.2, interval=1.0):
+    """Start watching folder/filename, preferring inotify over polling."""
+    try:
+        watcher = InotifyWatcher(folder, filename, callback, debounce)
+    except (OSError, AttributeError, TypeError):
+        # Not Linux, or inotify is unavailable
+        watcher = PollingWatcher(folder, filename, callback, debounce,
+                                 interval)
+    return watcher.start()
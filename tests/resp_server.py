@@ -0,0 +1,212 @@
+"""In-process stand-in for a Redis server, for tests.
+
+Implements the handful of commands RedisStore uses. Lua scripts are not
+interpreted; known scripts are mapped to Python equivalents by SHA1.
+"""
+import hashlib
+import socketserver
+import threading
+import time
+
+from retail.redis_store import ADJUST_SCRIPT, RESERVE_SCRIPT
+
+
+class _Status(str):
+    pass
+
+
+class _Error(str):
+    pass
+
+
+OK = _Status('OK')
+
+
+def _encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, _Error):
+        return b'-%s\r\n' % value.encode()
+    if isinstance(value, _Status):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    return b'*%d\r\n' % len(value) + b''.join(_encode(v) for v in value)
+
+
+def _read_command(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        length = int(rfile.readline()[1:-2])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+
+def _reserve(server, keys, args):
+    stock = server.hash(keys[0])
+    pairs = [(args[i], int(args[i + 1])) for i in range(0, len(args), 2)]
+    if keys[2] and keys[2] in server.data:
+        return [1] + [v for name, _ in pairs if name in stock
+                      for v in (name, int(stock[name]))]
+    for name, quantity in pairs:
+        if name in stock and int(stock[name]) < quantity:
+            return [0, name, int(stock[name])]
+    result = [1]
+    for name, quantity in pairs:
+        if name in stock:
+            stock[name] = b'%d' % (int(stock[name]) - quantity)
+            result += [name, int(stock[name])]
+    if keys[1]:
+        server.data.pop(keys[1], None)
+    if keys[2]:
+        server.data[keys[2]] = b'1'
+    return result
+
+
+def _adjust(server, keys, args):
+    stock = server.hash(keys[0])
+    levels = {}
+    result = [1]
+    for i in range(0, len(args), 3):
+        name = args[i]
+        level = levels.get(name, int(stock.get(name, 0)))
+        if args[i + 1] == b'delta':
+            level += int(args[i + 2])
+        else:
+            level = int(args[i + 2])
+        if level < 0:
+            return [0, i // 3, level]
+        levels[name] = level
+        result.append(level)
+    for name, level in levels.items():
+        stock[name] = b'%d' % level
+    return result
+
+
+SCRIPTS = {
+    hashlib.sha1(RESERVE_SCRIPT.encode()).hexdigest().encode(): _reserve,
+    hashlib.sha1(ADJUST_SCRIPT.encode()).hexdigest().encode(): _adjust,
+}
+
+
+class RespServer:
+    """A threaded RESP server holding its data in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.loaded_scripts = set()
+        self.commands = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    args = _read_command(self.rfile)
+                    if args is None:
+                        return
+                    self.wfile.write(_encode(server.execute(args)))
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                       Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.url = f'redis://127.0.0.1:{self.port}/0'
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def hash(self, key):
+        return self.data.setdefault(key, {})
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        handler = getattr(self, 'cmd_' + name.lower(), None)
+        if handler is None:
+            return _Error(f"ERR unknown command '{name}'")
+        with self.lock:
+            self.commands.append(name)
+            for key, expires in list(self.expires.items()):
+                if expires <= time.monotonic():
+                    self.data.pop(key, None)
+                    del self.expires[key]
+            return handler(*args[1:])
+
+    def cmd_ping(self):
+        return _Status('PONG')
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_get(self, key):
+        return self.data.get(key)
+
+    def cmd_set(self, key, value, *options):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if options and options[0].upper() == b'EX':
+            self.expires[key] = time.monotonic() + int(options[1])
+        return OK
+
+    def cmd_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def cmd_hget(self, key, field):
+        return self.hash(key).get(field)
+
+    def cmd_hset(self, key, *pairs):
+        stock = self.hash(key)
+        added = 0
+        for i in range(0, len(pairs), 2):
+            added += pairs[i] not in stock
+            stock[pairs[i]] = pairs[i + 1]
+        return added
+
+    def cmd_hsetnx(self, key, field, value):
+        stock = self.hash(key)
+        if field in stock:
+            return 0
+        stock[field] = value
+        return 1
+
+    def cmd_hincrby(self, key, field, amount):
+        stock = self.hash(key)
+        stock[field] = b'%d' % (int(stock.get(field, 0)) + int(amount))
+        return int(stock[field])
+
+    def cmd_hgetall(self, key):
+        return [v for item in self.hash(key).items() for v in item]
+
+    def cmd_eval(self, script, numkeys, *rest):
+        sha = hashlib.sha1(script).hexdigest().encode()
+        if sha not in SCRIPTS:
+            return _Error("ERR script not supported by the stand-in server")
+        self.loaded_scripts.add(sha)
+        return self._run_script(sha, numkeys, rest)
+
+    def cmd_evalsha(self, sha, numkeys, *rest):
+        if sha not in self.loaded_scripts:
+            return _Error("NOSCRIPT No matching script.")
+        return self._run_script(sha, numkeys, rest)
+
+    def _run_script(self, sha, numkeys, rest):
+        numkeys = int(numkeys)
+        return SCRIPTS[sha](self, list(rest[:numkeys]), list(rest[numkeys:]))
@@ -0,0 +1,56 @@
+import json
+
+from retail.accesslog import AccessLog
+
+
+def read_records(path):
+    """Read every JSON-lines record in a log file."""
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_records_written_in_batches(tmp_path):
+    """Queued records reach the file as JSON lines by close()."""
+    log = AccessLog(tmp_path / 'access.jsonl')
+    for i in range(100):
+        log.access(route='/', status=200, latency_ms=i)
+    log.audit('checkout', outcome='completed', items=2)
+    log.close()
+
+    records = read_records(tmp_path / 'access.jsonl')
+    assert len(records) == 101
+    assert records[0]['type'] == 'access'
+    assert records[-1] == {**records[-1], 'type': 'audit',
+                           'event': 'checkout', 'outcome': 'completed'}
+    assert log.stats()['batches'] < 101
+
+
+def test_overload_samples_access_and_keeps_audit(tmp_path):
+    """Past the sampling threshold only some access records are kept."""
+    log = AccessLog(tmp_path / 'access.jsonl', max_queue=10,
+                    sample_above=0, sample_rate=5)
+    # Queue directly without starting the writer, as if it were stalled
+    log._thread = object()
+    for _ in range(20):
+        log.access(route='/')
+    log.audit('checkout', outcome='rejected')
+    for _ in range(20):
+        log.audit('checkout', outcome='rejected')
+
+    stats = log.stats()
+    assert stats['sampled_out'] == 16
+    assert stats['queued'] == 10
+    assert stats['dropped'] == 15
+
+
+def test_rotates_by_size(tmp_path):
+    """The log is rotated once it passes max_bytes."""
+    path = tmp_path / 'access.jsonl'
+    log = AccessLog(path, max_bytes=200, backups=2, batch_size=1)
+    for _ in range(30):
+        log.access(route='/products', status=200)
+    log.close()
+
+    assert log.stats()['rotations'] > 2
+    assert (tmp_path / 'access.jsonl.1').exists()
+    assert (tmp_path / 'access.jsonl.2').exists()
+    assert not (tmp_path / 'access.jsonl.3').exists()
@@ -0,0 +1,44 @@
+import pytest
+
+from retail.admission import AdmissionController, Rejected, TokenBucket
+
+
+def test_token_bucket_limits_burst():
+    """A bucket allows its burst and then reports a wait."""
+    bucket = TokenBucket(rate=1.0, burst=2)
+
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 1
+
+
+def test_rate_limit_is_per_client():
+    """An exhausted client gets 429 without affecting other clients."""
+    admission = AdmissionController(
+        limits={'search': {'rate': 0.5, 'burst': 1}})
+    admission.admit('search', '10.0.0.1')
+    admission.release('search')
+
+    with pytest.raises(Rejected) as e:
+        admission.admit('search', '10.0.0.1')
+    assert e.value.status == 429
+    assert e.value.retry_after == 2
+
+    admission.admit('search', '10.0.0.2')
+    assert admission.metrics()['classes']['search']['rate_limited'] == 1
+
+
+def test_browse_is_shed_before_checkout():
+    """Under load low-priority classes are shed while checkout is admitted."""
+    admission = AdmissionController(max_inflight=10)
+    for n in range(6):
+        admission.admit('browse', f'client-{n}')
+
+    with pytest.raises(Rejected) as e:
+        admission.admit('browse', 'client-6')
+    assert e.value.status == 503
+
+    admission.admit('checkout', 'client-6')
+    metrics = admission.metrics()
+    assert metrics['inflight'] == 7
+    assert metrics['classes']['browse']['shed'] == 1
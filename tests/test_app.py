@@ -0,0 +1,287 @@
+import time
+
+import pytest
+
+from retail import app as app_module
+from retail.admission import AdmissionController
+from retail.idempotency import IdempotencyCache
+from retail.pagecache import PageCache
+from retail.shards import ShardRouter
+
+app = app_module.app
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """The app with its data folder, shards and caches under tmp_path."""
+    monkeypatch.setattr(app_module, 'get_data_folder', lambda: tmp_path)
+    monkeypatch.setattr(app_module, 'shards', ShardRouter(
+        app_module.make_shard, store_ids=['default', 'east'],
+        default=app_module.DEFAULT_STORE))
+    monkeypatch.setattr(app_module, '_ledger', None)
+    monkeypatch.setattr(app_module, '_orders', None)
+    monkeypatch.setattr(app_module, 'checkouts', IdempotencyCache())
+    monkeypatch.setattr(app_module, 'page_cache', PageCache(ttl=60))
+    monkeypatch.setattr(app_module, 'admission', AdmissionController())
+    for key, value in {'TESTING': True, 'WATCH_CATALOG': False,
+                       'ACCESS_LOG_ENABLED': False,
+                       'ADMISSION_ENABLED': False}.items():
+        monkeypatch.setitem(app.config, key, value)
+    yield app_module
+    if app_module._orders is not None:
+        app_module._orders.close()
+    app_module.shards.close()
+    if app_module._ledger is not None:
+        app_module._ledger.close()
+
+
+def add(client, name, quantity=1):
+    """Add a product to the client's cart."""
+    client.post('/add_to_cart', data={'product_name': name,
+                                      'quantity': str(quantity)})
+
+
+def flashes(client):
+    """Return and clear the messages flashed to the client."""
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def stock(web, name, store='default'):
+    """Return the current stock of a product."""
+    return web.shards.get(store).catalog.find(name)['stock']
+
+
+def test_checkout_is_post_only(web):
+    """A GET (e.g. a prefetched link) never checks out."""
+    assert app.test_client().get('/checkout').status_code == 405
+
+
+def test_double_submit_checks_out_once(web):
+    """Replaying a key returns the stored outcome without a second order."""
+    client = app.test_client()
+    add(client, 'phone', 2)
+    for _ in range(2):
+        response = client.post('/checkout', data={'idempotency_key': 'k1'})
+        assert response.status_code == 302
+
+    assert flashes(client)[-2:] == ["Thank you for your purchase!"] * 2
+    assert stock(web, 'phone') == 13
+    assert len(web.get_ledger().orders()) == 1
+
+
+def test_idempotency_key_scoped_to_visitor(web):
+    """Another client's identical key does not get the first outcome."""
+    first, second = app.test_client(), app.test_client()
+    add(first, 'phone')
+    first.post('/checkout', headers={'Idempotency-Key': '1'})
+    add(second, 'keyboard', 3)
+    second.post('/checkout', headers={'Idempotency-Key': '1'})
+
+    assert stock(web, 'phone') == 14
+    assert stock(web, 'keyboard') == 5
+    assert len(web.get_ledger().orders()) == 2
+
+
+def test_reused_key_with_new_cart_rejected(web):
+    """Reusing a key for a different cart is refused, not replayed."""
+    client = app.test_client()
+    add(client, 'phone')
+    client.post('/checkout', headers={'Idempotency-Key': '1'})
+    add(client, 'keyboard')
+    response = client.post('/checkout', headers={
+        'Idempotency-Key': '1', 'Accept': 'application/json'})
+
+    assert response.status_code == 422
+    assert stock(web, 'keyboard') == 8
+
+
+def test_rate_limited_requests_get_429_with_retry_after(web, monkeypatch):
+    """A client over its token bucket is answered 429 with Retry-After."""
+    monkeypatch.setitem(app.config, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(web, 'admission', AdmissionController(
+        limits={'checkout': {'rate': 0.01, 'burst': 1}}))
+    client = app.test_client()
+    client.post('/checkout')
+    response = client.post('/checkout')
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_overload_is_shed_with_503(web, monkeypatch):
+    """With no capacity left requests are shed with 503."""
+    monkeypatch.setitem(app.config, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(web, 'admission', AdmissionController(
+        max_inflight=0))
+    response = app.test_client().get('/')
+
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+
+def test_anonymous_listing_is_cached_without_cookie(web):
+    """Visitors without a session get a cached page and no Set-Cookie."""
+    client = app.test_client()
+    first = client.get('/')
+    second = client.get('/')
+
+    assert 'Set-Cookie' not in first.headers
+    assert 'Set-Cookie' not in second.headers
+    assert first.data == second.data
+    assert web.page_cache.stats()['hits'] == 1
+
+
+def test_event_streams_are_capped(web, monkeypatch):
+    """Streams beyond EVENT_MAX_STREAMS are refused with 503."""
+    events = web.shards.get('default').events
+    monkeypatch.setattr(events, 'max_streams', 0)
+    response = app.test_client().get('/events/stock')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_stale_event_id_gets_stock_snapshot(web):
+    """A Last-Event-ID from another process resyncs from a snapshot."""
+    response = app.test_client().get(
+        '/events/stock', headers={'Last-Event-ID': 'old:500'})
+    chunks = response.iter_encoded()
+    next(chunks)
+    resync = next(chunks).decode()
+    response.close()
+
+    assert 'event: resync' in resync
+    assert '{"sku":"keyboard","stock":8}' in resync
+    assert web.shards.get('default').events.streams == 0
+
+
+def test_store_routing_without_default_store(web, monkeypatch):
+    """With no 'default' store, requests naming none go to the first one."""
+    monkeypatch.setattr(web, 'shards', ShardRouter(
+        web.make_shard, store_ids=['east', 'west'],
+        default=web.DEFAULT_STORE))
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    add(client, 'phone')
+    assert client.get('/?store=west').status_code == 200
+    add(client, 'phone', 2)
+    with client.session_transaction() as session:
+        session['store'] = 'north'
+    assert client.get('/').status_code == 200
+    add(client, 'keyboard')
+
+    with client.session_transaction() as session:
+        assert 'store' not in session
+        carts = {key: [(i['name'], i['quantity']) for i in session[key]]
+                 for key in ('cart:east', 'cart:west')}
+    assert carts == {'cart:east': [('phone', 1), ('keyboard', 1)],
+                     'cart:west': [('phone', 2)]}
+    assert client.get('/', headers={'X-Store-Id': 'default'}
+                      ).status_code == 404
+
+
+def test_search_cache_survives_stock_changes(web):
+    """A checkout does not evict cached searches, which show live stock."""
+    client = app.test_client()
+    client.post('/search', data={'product_name': 'Phone'})
+    add(client, 'phone', 2)
+    client.post('/checkout')
+    response = client.post('/search', data={'product_name': 'phone '})
+
+    searches = web.shards.get('default').searches.stats()
+    assert (searches['hits'], searches['misses']) == (1, 1)
+    assert b'<span class="stock">13</span>' in response.data
+
+    catalog = web.shards.get('default').catalog
+    catalog.replace(catalog.snapshot())
+    client.post('/search', data={'product_name': 'phone'})
+    assert web.shards.get('default').searches.stats()['invalidations'] == 1
+
+
+def test_async_checkout_answers_202_and_reports_status(web, monkeypatch):
+    """The order is journaled before the 202 and can be polled to the end."""
+    monkeypatch.setitem(app.config, 'ASYNC_CHECKOUT', True)
+    client = app.test_client()
+    add(client, 'keyboard', 3)
+    response = client.post('/checkout',
+                           headers={'Accept': 'application/json'})
+
+    assert response.status_code == 202
+    order_id = response.get_json()['order_id']
+    assert response.headers['Location'].endswith(f'/orders/{order_id}')
+    journal = (web.get_data_folder() / 'order_journal.jsonl').read_text()
+    assert order_id in journal.splitlines()[0]
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        order = client.get(f'/orders/{order_id}',
+                           headers={'Accept': 'application/json'}).get_json()
+        if order['status'] == 'completed':
+            break
+        time.sleep(0.01)
+
+    assert order['status'] == 'completed'
+    assert stock(web, 'keyboard') == 5
+    assert [o['order_id'] for o in web.get_ledger().orders()] == [order_id]
+    assert client.get('/orders/missing').status_code == 404
+
+
+def test_temporary_failure_is_not_stored_for_key(web, monkeypatch):
+    """A retry after a ledger error checks out instead of replaying it."""
+    ledger = web.get_ledger()
+    record = ledger.record
+
+    def failing(*args, **kwargs):
+        monkeypatch.setattr(ledger, 'record', record)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ledger, 'record', failing)
+    client = app.test_client()
+    add(client, 'phone', 2)
+    client.post('/checkout', headers={'Idempotency-Key': 'abc'})
+    assert flashes(client)[-1] == "An unexpected error occurred during checkout"
+    assert stock(web, 'phone') == 15
+
+    client.post('/checkout', headers={'Idempotency-Key': 'abc'})
+    assert flashes(client)[-1] == "Thank you for your purchase!"
+    assert stock(web, 'phone') == 13
+    assert len(ledger.orders()) == 1
+
+
+def test_adjust_stock_cli_rejects_bad_batches(web, tmp_path):
+    """Malformed batches get a usage error, not a traceback."""
+    runner = app.test_cli_runner()
+    for text in ('{not json', '{"x": 1}', '{"adjustments": 3}'):
+        batch = tmp_path / 'batch.json'
+        batch.write_text(text)
+        result = runner.invoke(args=['adjust-stock', str(batch)])
+        assert result.exit_code == 2
+        assert "Invalid adjustment batch" in result.output
+
+    batch.write_text('name,delta\nphone,-5\n')
+    result = runner.invoke(args=['adjust-stock', str(batch)])
+    assert result.exit_code == 0
+    assert stock(web, 'phone') == 10
+
+
+def test_rejected_order_releases_its_holds(web, monkeypatch):
+    """An order failing in the stock stage frees its emptied cart's holds."""
+    for key in ('ASYNC_CHECKOUT', 'STOCK_HOLDS_ENABLED'):
+        monkeypatch.setitem(app.config, key, True)
+
+    def sold_out(order):
+        raise web.OrderRejected("keyboard is out of stock.")
+
+    monkeypatch.setattr(web, 'commit_order_stock', sold_out)
+    first, second = app.test_client(), app.test_client()
+    add(first, 'keyboard', 5)
+    response = first.post('/checkout', headers={'Accept': 'application/json'})
+    order_id = response.get_json()['order_id']
+    deadline = time.monotonic() + 5
+    while (web.get_orders().status(order_id)['status'] != 'failed'
+           and time.monotonic() < deadline):
+        time.sleep(0.01)
+
+    assert web.shards.get('default').holds.stats()['active'] == 0
+    add(second, 'keyboard', 8)
+    assert flashes(second)[-1] == "Added 8 keyboard(s) to cart"
@@ -0,0 +1,80 @@
+import threading
+
+from retail.catalog import Catalog
+from retail.combining import RateTracker, StockCombiner
+
+
+def make_catalog(tmp_path, stock):
+    """Create a catalog holding a single product."""
+    return Catalog(tmp_path / 'products.json',
+                   defaults=[{'name': 'laptop', 'price': 10, 'stock': stock}])
+
+
+def test_hot_sku_never_oversells(tmp_path):
+    """Combined requests are accepted exactly up to the available stock."""
+    catalog = make_catalog(tmp_path, 50)
+    stock = StockCombiner(catalog, hot_threshold=0)
+    results = []
+
+    def client():
+        results.append(stock.reserve([{'name': 'laptop', 'quantity': 1}]))
+
+    threads = [threading.Thread(target=client) for _ in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    accepted = [r for r in results if r[0]]
+    rejected = [r for r in results if not r[0]]
+    assert len(accepted) == 50
+    assert len(rejected) == 14
+    assert rejected[0][1] == "laptop is out of stock. Only 0 available."
+    assert catalog.find('laptop')['stock'] == 0
+    assert stock.combined_requests == 64
+    assert stock.stats()['hot_skus'] == ['laptop']
+
+
+def test_cold_sku_takes_lock_path(tmp_path):
+    """Below the threshold requests are applied directly."""
+    catalog = make_catalog(tmp_path, 5)
+    stock = StockCombiner(catalog, hot_threshold=1000)
+
+    assert stock.reserve([{'name': 'laptop', 'quantity': 2}]) == (True, None)
+    assert stock.combined_requests == 0
+    assert catalog.find('laptop')['stock'] == 3
+
+    stock.release([{'name': 'laptop', 'quantity': 2}])
+    assert catalog.find('laptop')['stock'] == 5
+    assert stock.stats() == {'hot_threshold': 1000, 'hot_skus': [],
+                             'combined_batches': 0, 'combined_requests': 0}
+
+
+def test_rate_tracker_detects_hot_keys():
+    """Request rate is measured per key."""
+    rates = RateTracker(window=1.0)
+    for _ in range(100):
+        rates.hit('laptop')
+    rates.hit('phone')
+
+    assert rates.rate('laptop') >= 100
+    assert rates.rate('phone') < 2
+    assert rates.above(50) == ['laptop']
+
+
+def test_order_stock_is_taken_once(tmp_path):
+    """Replaying an order id leaves stock alone, even after a restart."""
+    catalog = make_catalog(tmp_path, 5)
+    stock = StockCombiner(catalog)
+    items = [{'name': 'laptop', 'quantity': 2}]
+    assert stock.reserve(items, order_id='o1') == (True, None)
+    assert stock.reserve(items, order_id='o1') == (True, None)
+    assert catalog.find('laptop')['stock'] == 3
+    catalog.write()
+
+    restarted = StockCombiner(Catalog(tmp_path / 'products.json'))
+    assert restarted.reserve(items, order_id='o1') == (True, None)
+    assert restarted.catalog.find('laptop')['stock'] == 3
+    restarted.release(items, order_id='o1')
+    assert restarted.reserve(items, order_id='o1') == (True, None)
+    assert restarted.catalog.find('laptop')['stock'] == 3
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from retail.events import Broadcaster, TooManyStreams
+
+
+def test_stream_yields_published_events():
+    """Subscribers receive events published after they connect."""
+    events = Broadcaster()
+    stream = events.stream(heartbeat=5, max_duration=5)
+    assert next(stream) == 'retry: 3000\n\n'
+
+    threading.Timer(0.05, events.publish,
+                    args=('stock', [{'sku': 'laptop', 'stock': 3}])).start()
+    assert next(stream) == (f'id: {events.epoch}:1\nevent: stock\n'
+                            'data: [{"sku":"laptop","stock":3}]\n\n')
+
+
+def test_resume_from_last_event_id():
+    """A reconnecting client gets the events it missed."""
+    events = Broadcaster()
+    for stock in (3, 2, 1):
+        events.publish('stock', [{'sku': 'laptop', 'stock': stock}])
+
+    missed = events.since(1, timeout=0)
+    assert [event_id for event_id, _, _ in missed] == [2, 3]
+
+
+def test_idle_stream_sends_heartbeat_and_ends():
+    """Idle streams send keep-alives and close after max_duration."""
+    events = Broadcaster()
+    chunks = list(events.stream(heartbeat=0.01, max_duration=0.05))
+
+    assert chunks[0] == 'retry: 3000\n\n'
+    assert ': keep-alive\n\n' in chunks
+
+
+def test_unknown_last_event_id_gets_resync():
+    """An id from another process or past the history gets a snapshot."""
+    events = Broadcaster(history=2)
+    for stock in (3, 2, 1):
+        events.publish('stock', [{'sku': 'laptop', 'stock': stock}])
+    snapshot = [{'sku': 'laptop', 'stock': 1}]
+    resync = (f'id: {events.epoch}:3\nevent: resync\n'
+              'data: [{"sku":"laptop","stock":1}]\n\n')
+
+    for last_event_id in ('other:500', f'{events.epoch}:500',
+                          f'{events.epoch}:0'):
+        stream = events.stream(last_event_id, snapshot=lambda: snapshot,
+                               heartbeat=0.01, max_duration=1)
+        assert next(stream) == 'retry: 3000\n\n'
+        assert next(stream) == resync
+        assert next(stream) == ': keep-alive\n\n'
+        stream.close()
+
+    stream = events.stream(f'{events.epoch}:1', snapshot=lambda: snapshot)
+    next(stream)
+    assert next(stream).startswith(f'id: {events.epoch}:2\nevent: stock')
+    stream.close()
+
+
+def test_concurrent_streams_are_capped():
+    """Streams beyond max_streams are refused until one closes."""
+    events = Broadcaster(max_streams=1)
+    stream = events.stream()
+    with pytest.raises(TooManyStreams):
+        events.stream()
+
+    next(stream)
+    stream.close()
+    assert events.streams == 0
+    # Closed before its first chunk, as when a client drops at once
+    events.stream().close()
+    assert events.streams == 0
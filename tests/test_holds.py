@@ -0,0 +1,55 @@
+from retail.catalog import Catalog
+from retail.combining import StockCombiner
+from retail.holds import StockHolds
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_holds_limit_other_carts():
+    """Held units are unavailable to other carts until released."""
+    holds = StockHolds(ttl=60, clock=Clock())
+
+    assert holds.hold('a', 'laptop', 3, stock=5) == (True, 5)
+    assert holds.hold('b', 'laptop', 3, stock=5) == (False, 2)
+    assert holds.held('laptop', 'b') == 3
+    assert holds.held('laptop', 'a') == 0
+
+    holds.release_cart('a', ['laptop'])
+    assert holds.hold('b', 'laptop', 3, stock=5) == (True, 5)
+
+
+def test_holds_expire_after_ttl():
+    """A hold lapses once its TTL passes; adding again refreshes it."""
+    clock = Clock()
+    holds = StockHolds(ttl=60, clock=clock)
+    holds.hold('a', 'laptop', 2, stock=5)
+    clock.now = 50
+    holds.hold('a', 'laptop', 1, stock=5)
+
+    clock.now = 100
+    assert holds.held('laptop') == 3
+    clock.now = 111
+    assert holds.held('laptop') == 0
+    assert holds.stats() == {'active': 0, 'expired': 1}
+
+
+def test_reserve_respects_other_carts_holds(tmp_path):
+    """Checkout cannot take units held for another cart."""
+    catalog = Catalog(tmp_path / 'products.json',
+                      defaults=[{'name': 'laptop', 'price': 10, 'stock': 5}])
+    stock = StockCombiner(catalog, hot_threshold=1000)
+    holds = StockHolds(ttl=60, clock=Clock())
+    holds.hold('a', 'laptop', 4, stock=5)
+    items = [{'name': 'laptop', 'quantity': 2}]
+
+    assert stock.reserve(items, held=lambda n: holds.held(n, 'b')) == (
+        False, "laptop is out of stock. Only 1 available.")
+    assert stock.reserve(items, held=lambda n: holds.held(n, 'a')) == (
+        True, None)
+    assert catalog.find('laptop')['stock'] == 3
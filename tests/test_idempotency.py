@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from retail.idempotency import IdempotencyCache, KeyReused
+
+
+def test_duplicate_key_returns_stored_result():
+    """The function runs once per key."""
+    cache = IdempotencyCache()
+    calls = []
+
+    def work():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.run('abc', work) == 1
+    assert cache.run('abc', work) == 1
+    assert cache.run('def', work) == 2
+    assert cache.hits == 1
+
+
+def test_concurrent_duplicates_wait_for_first_request():
+    """A duplicate arriving mid-flight waits instead of re-running."""
+    cache = IdempotencyCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'done'
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(
+        cache.run('abc', work)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(
+        cache.run('abc', work)))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+
+    assert results == ['done', 'done']
+    assert len(calls) == 1
+
+
+def test_entries_are_bounded_and_expire():
+    """Old keys are evicted by size and by TTL."""
+    cache = IdempotencyCache(max_entries=2, ttl=600)
+    for key in 'abc':
+        cache.run(key, lambda: key)
+    assert cache.run('a', lambda: 'again') == 'again'
+
+    expiring = IdempotencyCache(ttl=0)
+    expiring.run('a', lambda: 1)
+    assert expiring.run('a', lambda: 2) == 2
+
+
+def test_reused_key_with_different_request_rejected():
+    """A key replayed for a different request doesn't get its result."""
+    cache = IdempotencyCache()
+    cache.run('abc', lambda: 'first', fingerprint='cart-1')
+
+    assert cache.run('abc', lambda: 'again', fingerprint='cart-1') == 'first'
+    assert cache.run('abc', lambda: 'again') == 'first'
+    with pytest.raises(KeyReused):
+        cache.run('abc', lambda: 'second', fingerprint='cart-2')
@@ -0,0 +1,90 @@
+import random
+
+from retail.catalog import Catalog
+from retail.indexes import CatalogIndex
+
+
+def make_index(tmp_path, count=200):
+    """Build an index over a catalog of random products."""
+    rng = random.Random(7)
+    catalog = Catalog(tmp_path / 'products.json', defaults=[
+        {'name': f'item{n:03d}', 'price': rng.randint(1, 300),
+         'stock': rng.randint(0, 3)}
+        for n in range(count)
+    ])
+    return catalog, CatalogIndex(catalog)
+
+
+def brute_force(catalog, min_price, max_price, in_stock, sort):
+    """Reference answer by scanning and sorting the whole catalog."""
+    products = [p for p in catalog.products()
+                if (min_price is None or p['price'] >= min_price)
+                and (max_price is None or p['price'] <= max_price)
+                and (not in_stock or p['stock'] > 0)]
+    if sort == 'name':
+        return sorted(products, key=lambda p: p['name'])
+    return sorted(products, key=lambda p: (p['price'], p['name']),
+                  reverse=sort == '-price')
+
+
+def test_queries_match_a_full_scan(tmp_path):
+    """Filtered, sorted pages agree with a linear scan."""
+    catalog, index = make_index(tmp_path)
+    for min_price, max_price in ((None, None), (50, 100), (None, 99.99),
+                                 (250, None), (400, 500)):
+        for in_stock in (False, True):
+            for sort in ('price', '-price', 'name'):
+                expected = brute_force(catalog, min_price, max_price,
+                                       in_stock, sort)
+                page, total = index.query(min_price, max_price, in_stock,
+                                          sort, offset=5, limit=10)
+                assert total == len(expected)
+                if sort == '-price':
+                    # Ties on price may come in either name order
+                    assert ([p['price'] for p in page]
+                            == [p['price'] for p in expected[5:15]])
+                else:
+                    assert page == expected[5:15]
+
+
+def test_stock_changes_update_in_stock_index(tmp_path):
+    """Selling out or restocking moves a product in or out of the index."""
+    catalog, index = make_index(tmp_path, count=3)
+    for product in catalog.products():
+        product['stock'] = 1
+    catalog.changed([p['name'] for p in catalog.products()])
+    assert index.query(in_stock=True)[1] == 3
+
+    catalog.find('item001')['stock'] = 0
+    catalog.changed(['item001'])
+    names = [p['name'] for p in index.query(in_stock=True, sort='name')[0]]
+    assert names == ['item000', 'item002']
+    assert index.in_stock() == {'item000', 'item002'}
+
+
+def test_replacing_catalog_rebuilds(tmp_path):
+    """A replaced catalog is fully re-indexed."""
+    catalog, index = make_index(tmp_path, count=3)
+    catalog.replace([{'name': 'Solo', 'price': 5, 'stock': 1}])
+
+    assert index.query() == ([catalog.find('solo')], 1)
+
+
+def test_large_change_rebuilds_once(tmp_path, monkeypatch):
+    """A change to most of the catalog rebuilds instead of moving items."""
+    catalog, index = make_index(tmp_path)
+    index.rebuild()
+    rebuilds = []
+    rebuild = index.rebuild
+    monkeypatch.setattr(index, 'rebuild', lambda: rebuilds.append(1)
+                        or rebuild())
+    for product in catalog.products():
+        product['stock'] = 0
+    catalog.changed([p['name'] for p in catalog.products()])
+
+    assert rebuilds == [1]
+    assert index.query(in_stock=True) == ([], 0)
+    catalog.find('item001')['stock'] = 2
+    catalog.changed(['item001'])
+    assert rebuilds == [1]
+    assert index.query(in_stock=True)[1] == 1
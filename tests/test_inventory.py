@@ -0,0 +1,100 @@
+import pytest
+
+from retail.catalog import Catalog
+from retail.inventory import apply_adjustments, parse_adjustments
+
+
+def make_catalog(tmp_path):
+    """Create a catalog with two products."""
+    return Catalog(tmp_path / 'products.json', defaults=[
+        {'name': 'laptop', 'price': 999.99, 'stock': 10},
+        {'name': 'phone', 'price': 499.99, 'stock': 5}
+    ])
+
+
+def test_batch_is_applied_with_one_change(tmp_path):
+    """Absolute and delta rows apply in order with one notification."""
+    catalog = make_catalog(tmp_path)
+    notified = []
+    catalog.subscribe(notified.append)
+
+    applied, results = apply_adjustments(catalog, [
+        {'name': 'laptop', 'stock': 3},
+        {'name': 'Laptop', 'delta': -1},
+        {'name': 'phone', 'delta': '4'}
+    ])
+
+    assert applied
+    assert [r['stock'] for r in results] == [3, 2, 9]
+    assert catalog.find('laptop')['stock'] == 2
+    assert catalog.find('phone')['stock'] == 9
+    assert len(notified) == 1
+
+
+def test_invalid_row_rejects_whole_batch(tmp_path):
+    """Nothing changes when any row fails validation."""
+    catalog = make_catalog(tmp_path)
+
+    applied, results = apply_adjustments(catalog, [
+        {'name': 'laptop', 'stock': 3},
+        {'name': 'phone', 'delta': -6},
+        {'name': 'tablet', 'stock': 1},
+        {'name': 'phone', 'stock': 1.5}
+    ])
+
+    assert not applied
+    assert [r['status'] for r in results] == ['not applied', 'error',
+                                              'error', 'error']
+    assert results[1]['error'] == "Stock would become -1"
+    assert results[2]['error'] == "Product not found"
+    assert catalog.find('laptop')['stock'] == 10
+    assert catalog.version == 0
+
+
+def test_parse_csv_and_json():
+    """Batches can be CSV with a header, or JSON."""
+    assert parse_adjustments('name,stock,delta\nlaptop,4,\nphone,,-2\n') == [
+        {'name': 'laptop', 'stock': '4'}, {'name': 'phone', 'delta': '-2'}]
+    assert parse_adjustments('{"adjustments": [{"name": "a", "stock": 1}]}'
+                             ) == [{'name': 'a', 'stock': 1}]
+
+
+def test_shared_store_is_written_before_the_catalog(tmp_path):
+    """A failing or refusing store leaves the catalog untouched."""
+    catalog = make_catalog(tmp_path)
+
+    def unreachable(changes):
+        raise ConnectionError("store unavailable")
+
+    with pytest.raises(ConnectionError):
+        apply_adjustments(catalog, [{'name': 'laptop', 'delta': -1}],
+                          apply=unreachable)
+    applied, results = apply_adjustments(
+        catalog, [{'name': 'laptop', 'delta': 2},
+                  {'name': 'phone', 'delta': -5}],
+        apply=lambda changes: (False, (1, -2)))
+
+    assert not applied
+    assert [r['status'] for r in results] == ['not applied', 'error']
+    assert results[1]['error'] == "Stock would become -2"
+    assert catalog.find('laptop')['stock'] == 10
+    assert catalog.version == 0
+
+
+def test_catalog_takes_the_store_levels(tmp_path):
+    """Levels returned by the shared store win over the local estimate."""
+    catalog = make_catalog(tmp_path)
+    seen = []
+
+    def adjust(changes):
+        seen.extend(changes)
+        return True, [7, 4]
+
+    applied, results = apply_adjustments(
+        catalog, [{'name': 'LAPTOP', 'delta': -1},
+                  {'name': 'phone', 'stock': '4'}], apply=adjust)
+
+    assert applied
+    assert seen == [('laptop', 'delta', -1), ('phone', 'stock', 4)]
+    assert [r['stock'] for r in results] == [7, 4]
+    assert catalog.find('laptop')['stock'] == 7
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from retail.ledger import GroupCommitWriter, LedgerClosedError, OrderLedger
+
+
+def test_record_order_is_durable(tmp_path):
+    """A recorded order can be read back with its totals."""
+    ledger = OrderLedger(tmp_path / 'orders.jsonl')
+    order = ledger.record([
+        {'name': 'laptop', 'price': 999.99, 'quantity': 1},
+        {'name': 'keyboard', 'price': 59.99, 'quantity': 2}
+    ])
+    ledger.close()
+
+    assert order['total'] == 1119.97
+    assert [o['order_id'] for o in ledger.orders()] == [order['order_id']]
+
+
+def test_concurrent_appends_share_batches(tmp_path):
+    """Concurrent writers are grouped into fewer fsync batches."""
+    writer = GroupCommitWriter(tmp_path / 'orders.jsonl', max_batch=16,
+                               max_latency=0.05)
+    threads = [threading.Thread(target=writer.append, args=({'n': i},))
+               for i in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    assert writer.records == 32
+    assert writer.batches < 32
+    assert len((tmp_path / 'orders.jsonl').read_text().splitlines()) == 32
+
+
+def test_append_after_close_fails(tmp_path):
+    """Appending to a closed writer raises."""
+    writer = GroupCommitWriter(tmp_path / 'orders.jsonl')
+    writer.close()
+    with pytest.raises(LedgerClosedError):
+        writer.append({'n': 1})
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+
+import pytest
+
+from retail.ledger import JournalLocked, OrderJournal
+from retail.orders import OrderPipeline, OrderRejected, QueueFull
+
+
+def wait_for(pipeline, order_id, timeout=5.0):
+    """Poll an order until it has finished."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        order = pipeline.status(order_id)
+        if order['status'] in ('completed', 'failed'):
+            return order
+        time.sleep(0.01)
+    raise AssertionError("order did not finish")
+
+
+def test_retries_resume_at_failed_stage():
+    """A transient failure is retried without rerunning earlier stages."""
+    calls = []
+    failures = [OSError("disk busy"), OSError("disk busy")]
+
+    def persist(order):
+        calls.append('persist')
+        if failures:
+            raise failures.pop()
+
+    pipeline = OrderPipeline([('stock', lambda o: calls.append('stock')),
+                              ('persist', persist)], workers=1, backoff=0)
+    order = wait_for(pipeline, pipeline.submit({'items': []}))
+    pipeline.close()
+
+    assert order['status'] == 'completed'
+    assert order['attempts'] == 4
+    assert calls == ['stock', 'persist', 'persist', 'persist']
+    assert pipeline.stats()['retried'] == 2
+
+
+def test_rejected_order_undoes_completed_stages():
+    """A rejection fails the order at once and reports what had run."""
+    undone = []
+
+    def reject(order):
+        raise OrderRejected("laptop is out of stock. Only 0 available.")
+
+    pipeline = OrderPipeline([('stock', lambda o: None), ('persist', reject)],
+                             workers=1, backoff=0,
+                             on_failed=lambda o, done: undone.append(done))
+    order = wait_for(pipeline, pipeline.submit({'items': []}))
+    pipeline.close()
+
+    assert order['status'] == 'failed'
+    assert order['message'] == "laptop is out of stock. Only 0 available."
+    assert order['attempts'] == 2
+    assert undone == [['stock']]
+
+
+def test_full_queue_sheds_orders():
+    """Submissions beyond the queue bound are refused, not blocked on."""
+    release = threading.Event()
+    pipeline = OrderPipeline([('slow', lambda o: release.wait())],
+                             workers=1, max_queue=1)
+    first = pipeline.submit({})
+    while pipeline.status(first)['status'] == 'queued':
+        time.sleep(0.01)
+    pipeline.submit({})
+
+    with pytest.raises(QueueFull):
+        pipeline.submit({})
+    release.set()
+    pipeline.close()
+    assert pipeline.stats()['completed'] == 2
+
+
+def test_callback_errors_do_not_stop_workers(caplog):
+    """Orders keep finishing when the failure and finish callbacks raise."""
+    def broken(*args):
+        raise RuntimeError("callback bug")
+
+    def reject(order):
+        raise OrderRejected("out of stock")
+
+    pipeline = OrderPipeline([('stock', reject)], workers=1, backoff=0,
+                             on_failed=broken, on_finished=broken)
+    first = wait_for(pipeline, pipeline.submit({}))
+    second = wait_for(pipeline, pipeline.submit({}))
+    pipeline.close()
+
+    assert (first['status'], second['status']) == ('failed', 'failed')
+    assert "Error undoing stages [] of order" in caplog.text
+    assert "Error reporting order" in caplog.text
+
+
+def test_journal_resumes_unfinished_orders(tmp_path):
+    """Orders cut short by a crash resume after their last done stage."""
+    path = tmp_path / 'journal.jsonl'
+    records = [{'order': {'order_id': 'a', 'status': 'queued',
+                          'attempts': 0}},
+               {'order_id': 'a', 'stage': 'stock'},
+               {'order': {'order_id': 'b', 'status': 'queued',
+                          'attempts': 0}},
+               {'order_id': 'b', 'status': 'completed'}]
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records)
+                    + '{"order_id": "a", "st')
+    # Recovery also drops finished orders and the torn last line
+    journal = OrderJournal(path)
+    assert journal.recover() == [(records[0]['order'], ['stock'])]
+    journal.close()
+    assert list(map(json.loads, path.read_text().splitlines())) == records[:2]
+
+    calls = []
+    pipeline = OrderPipeline(
+        [('stock', lambda o: calls.append(('stock', o['order_id']))),
+         ('persist', lambda o: calls.append(('persist', o['order_id'])))],
+        workers=1, journal=OrderJournal(path))
+    order = wait_for(pipeline, 'a')
+    new = wait_for(pipeline, pipeline.submit({}))
+    pipeline.close()
+
+    assert order['status'] == 'completed' and order['recovered']
+    assert calls == [('persist', 'a'), ('stock', new['order_id']),
+                     ('persist', new['order_id'])]
+    journal = OrderJournal(path)
+    assert journal.recover() == []
+    journal.close()
+
+
+def test_journal_has_one_owner(tmp_path):
+    """A journal another pipeline holds cannot be opened until closed."""
+    journal = OrderJournal(tmp_path / 'journal.jsonl')
+    with pytest.raises(JournalLocked):
+        OrderJournal(tmp_path / 'journal.jsonl')
+    journal.close()
+    OrderJournal(tmp_path / 'journal.jsonl').close()
@@ -0,0 +1,31 @@
+from retail.pagecache import PageCache
+
+
+def test_page_served_until_version_changes():
+    """A cached page is dropped once the catalog version moves on."""
+    cache = PageCache(ttl=60)
+    cache.put('/', 1, '<html>v1</html>')
+
+    assert cache.get('/', 1) == '<html>v1</html>'
+    assert cache.get('/', 2) is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_page_expires_after_ttl():
+    """Entries are not served past their TTL."""
+    cache = PageCache(ttl=0)
+    cache.put('/', 1, 'page')
+
+    assert cache.get('/', 1) is None
+
+
+def test_cache_is_bounded():
+    """The least recently used page is evicted first."""
+    cache = PageCache(ttl=60, max_entries=2)
+    cache.put('/?page=1', 1, 'one')
+    cache.put('/?page=2', 1, 'two')
+    cache.get('/?page=1', 1)
+    cache.put('/?page=3', 1, 'three')
+
+    assert cache.get('/?page=2', 1) is None
+    assert cache.get('/?page=1', 1) == 'one'
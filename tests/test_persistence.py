@@ -0,0 +1,50 @@
+import json
+import time
+
+from retail.catalog import Catalog
+from retail.persistence import WriteBehindQueue
+
+
+def test_burst_of_changes_is_coalesced(tmp_path):
+    """Many mutations collapse into a single write."""
+    writes = []
+    queue = WriteBehindQueue(writes.append, interval=60, max_dirty=100)
+    for _ in range(100):
+        queue.mark_dirty(['laptop'])
+    queue.mark_dirty(['phone'])
+    queue.close()
+
+    assert writes == [{'laptop', 'phone'}]
+
+
+def test_size_threshold_triggers_background_flush(tmp_path):
+    """Reaching max_dirty flushes without waiting for the timer."""
+    catalog = Catalog(tmp_path / 'products.json')
+    catalog.replace([{'name': f'p{i}', 'price': 1, 'stock': 1}
+                     for i in range(3)])
+    queue = WriteBehindQueue(catalog.write, interval=60, max_dirty=3)
+    queue.mark_dirty(['p0', 'p1', 'p2'])
+    # The timer is 60s away, so only the size threshold can flush this
+    deadline = time.monotonic() + 5
+    while queue.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert queue.flushes == 1
+    assert queue.pending() == 0
+    assert len(json.loads((tmp_path / 'products.json').read_text())) == 3
+    queue.close()
+
+
+def test_catalog_changes_reach_disk_on_close(tmp_path):
+    """Dirty catalog changes are written on the forced shutdown flush."""
+    path = tmp_path / 'products.json'
+    catalog = Catalog(path, defaults=[{'name': 'laptop', 'stock': 10}])
+    queue = WriteBehindQueue(catalog.write, interval=60)
+    catalog.subscribe(queue.mark_dirty)
+
+    catalog.find('LAPTOP')['stock'] = 4
+    catalog.changed(['laptop'])
+    assert json.loads(path.read_text())[0]['stock'] == 10
+
+    queue.close()
+    assert json.loads(path.read_text())[0]['stock'] == 4
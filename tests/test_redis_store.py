@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from retail.redis_store import RedisPool, RedisStore
+from tests.resp_server import RespServer
+
+
+@pytest.fixture
+def server():
+    """Start a local in-process stand-in for a Redis server."""
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def store(server):
+    """A store seeded with two products."""
+    store = RedisStore(RedisPool.from_url(server.url, max_connections=4))
+    store.seed_stock([{'name': 'laptop', 'stock': 10},
+                      {'name': 'phone', 'stock': 1}])
+    yield store
+    store.pool.close()
+
+
+def test_seed_does_not_overwrite_shared_stock(store):
+    """Seeding only creates counters that do not exist yet."""
+    store.set_stock({'laptop': 3})
+    store.seed_stock([{'name': 'laptop', 'stock': 10}])
+
+    assert store.stock_levels() == {'laptop': 3, 'phone': 1}
+
+
+def test_reserve_is_all_or_nothing(store):
+    """A cart with one short item decrements nothing."""
+    reserved, message = store.reserve([{'name': 'laptop', 'quantity': 2},
+                                       {'name': 'phone', 'quantity': 2}])
+
+    assert not reserved
+    assert message == "phone is out of stock. Only 1 available."
+    assert store.stock_levels() == {'laptop': 10, 'phone': 1}
+
+
+def test_reserve_and_cart_delete_are_one_command(server, store):
+    """Checkout is two round trips: read the cart, then one EVALSHA.
+
+    The EVALSHA checks and decrements stock and deletes the cart
+    atomically. The stand-in server maps the script's SHA to a Python
+    equivalent, so RESERVE_SCRIPT's Lua itself is not executed here.
+    """
+    store.save_cart('abc', [{'name': 'laptop', 'price': 1, 'quantity': 2}])
+    store.reserve([{'name': 'laptop', 'quantity': 1}])  # loads the script
+    del server.commands[:]
+
+    reserved, levels = store.reserve(store.get_cart('abc'), cart_id='abc')
+
+    assert reserved
+    assert levels == {'laptop': 7}
+    assert server.commands == ['GET', 'EVALSHA']
+    assert store.get_cart('abc') == []
+
+
+def test_concurrent_reservations_never_oversell(store):
+    """Server-side decrements stay atomic across clients."""
+    results = []
+
+    def client():
+        results.append(store.reserve([{'name': 'laptop', 'quantity': 1}])[0])
+
+    threads = [threading.Thread(target=client) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 10
+    assert store.stock_levels()['laptop'] == 0
+
+
+def test_adjust_applies_deltas_to_current_levels(store):
+    """A delta computed from a stale read keeps concurrent checkouts."""
+    store.reserve([{'name': 'laptop', 'quantity': 3}])
+
+    adjusted, stocks = store.adjust([('laptop', 'delta', 5),
+                                     ('phone', 'stock', 4),
+                                     ('phone', 'delta', -1)])
+
+    assert adjusted
+    assert stocks == [12, 4, 3]
+    assert store.stock_levels() == {'laptop': 12, 'phone': 3}
+
+
+def test_adjust_is_all_or_nothing(store):
+    """A change that would go negative leaves every level alone."""
+    adjusted, (index, stock) = store.adjust([('laptop', 'stock', 0),
+                                             ('phone', 'delta', -2)])
+
+    assert not adjusted
+    assert (index, stock) == (1, -1)
+    assert store.stock_levels() == {'laptop': 10, 'phone': 1}
+
+
+def test_order_stock_is_taken_once(store):
+    """A replayed order gets the current levels without a second decrement."""
+    items = [{'name': 'laptop', 'quantity': 2}]
+    assert store.reserve(items, order_id='o1') == (True, {'laptop': 8})
+    assert store.reserve(items, order_id='o1') == (True, {'laptop': 8})
+    store.release(items, order_id='o1')
+    assert store.reserve(items, order_id='o1') == (True, {'laptop': 8})
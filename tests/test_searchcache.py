@@ -0,0 +1,45 @@
+from retail.searchcache import SearchCache, normalize
+
+
+def test_normalised_queries_share_an_entry():
+    """Case and spacing variants of a query hit the same entry."""
+    cache = SearchCache()
+    calls = []
+
+    def lookup(query):
+        calls.append(query)
+        return {'name': query}
+
+    assert cache.run('Gaming  Laptop', 1, lookup) == {'name': 'gaming laptop'}
+    assert cache.run(' gaming laptop', 1, lookup) == {'name': 'gaming laptop'}
+    assert calls == ['gaming laptop']
+    assert normalize(' A\tB ') == 'a b'
+
+
+def test_version_change_invalidates():
+    """A new catalog version drops every cached result."""
+    cache = SearchCache()
+    cache.run('laptop', 1, lambda q: 'v1')
+
+    assert cache.run('laptop', 2, lambda q: 'v2') == 'v2'
+    # Requests still on an older version are served but not cached
+    assert cache.run('laptop', 1, lambda q: 'stale') == 'stale'
+    assert cache.run('laptop', 2, lambda q: 'v3') == 'v2'
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_negative_results_cached_separately():
+    """Misspelt queries are bounded on their own and don't evict results."""
+    cache = SearchCache(max_entries=2, max_negative=2)
+    cache.run('laptop', 1, lambda q: 'laptop')
+    for query in ('lapop', 'latpop', 'laptpo'):
+        cache.run(query, 1, lambda q: None)
+
+    assert cache.run('laptop', 1, lambda q: 'recomputed') == 'laptop'
+    assert cache.run('laptpo', 1, lambda q: 'found') is None
+    assert cache.run('lapop', 1, lambda q: 'found') == 'found'
+    stats = cache.stats()
+    assert stats['negative_entries'] == 2
+    assert (stats['hits'], stats['negative_hits'], stats['misses']) == (1, 1, 5)
+    assert stats['hit_ratio'] == round(2 / 7, 4)
+    assert stats['latency']['miss']['count'] == 5
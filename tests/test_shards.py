@@ -0,0 +1,55 @@
+import pytest
+
+from retail.shards import Shard, ShardRouter
+
+PRODUCTS = [{'name': 'laptop', 'price': 10, 'stock': 5}]
+
+
+def make_router(tmp_path, store_ids=None):
+    """Create a router whose shards live under tmp_path."""
+    def factory(store_id):
+        return Shard(store_id, tmp_path / store_id / 'products.json',
+                     defaults=PRODUCTS)
+    return ShardRouter(factory, store_ids)
+
+
+def test_shards_are_independent(tmp_path):
+    """Each store has its own catalog, lock and file."""
+    shards = make_router(tmp_path)
+    east, west = shards.get('east'), shards.get('west')
+    east.stock.reserve([{'name': 'laptop', 'quantity': 2}])
+    east.close()
+    west.close()
+
+    assert east.catalog.lock is not west.catalog.lock
+    assert east.catalog.find('laptop')['stock'] == 3
+    assert west.catalog.find('laptop')['stock'] == 5
+    assert '"stock": 3' in (tmp_path / 'east' / 'products.json').read_text()
+    assert shards.get('east') is east
+
+
+def test_unknown_or_malformed_store_rejected(tmp_path):
+    """Only configured, well-formed store ids are routed."""
+    shards = make_router(tmp_path, store_ids=['east'])
+
+    with pytest.raises(KeyError):
+        shards.get('west')
+    with pytest.raises(KeyError):
+        make_router(tmp_path).get('../etc')
+
+
+def test_malformed_configured_store_fails_at_startup(tmp_path):
+    """Configuring an id that could never be routed is an error up front."""
+    for store_ids in (['east', '../etc'], ['East'], ['a.b']):
+        with pytest.raises(ValueError):
+            make_router(tmp_path, store_ids=store_ids)
+
+
+def test_load_builds_every_shard(tmp_path):
+    """Shards load in parallel and come back ready to query."""
+    shards = make_router(tmp_path)
+    loaded = shards.load(['a', 'b', 'c'])
+
+    assert [shard.store_id for shard in loaded] == ['a', 'b', 'c']
+    assert all(s.index.query(in_stock=True)[1] == 1 for s in loaded)
+    assert set(shards.stats()) == {'a', 'b', 'c'}
@@ -0,0 +1,75 @@
+import random
+
+from retail.timerwheel import HierarchicalTimerWheel
+
+
+def test_timers_fire_when_due():
+    """Randomly scheduled timers fire at their deadline, not before."""
+    rng = random.Random(7)
+    wheel = HierarchicalTimerWheel(tick=1.0, size=4, levels=3)
+    fired = []
+    expected = []
+    for _ in range(500):
+        when = rng.uniform(0, 200)
+        expected.append(when)
+        wheel.schedule(when, lambda when=when: fired.append((when, now)))
+
+    now = 0.0
+    while now < 210:
+        now += rng.uniform(0, 3)
+        wheel.advance(now)
+
+    assert sorted(w for w, _ in fired) == sorted(expected)
+    assert all(when <= at < when + 4 for when, at in fired)
+    assert wheel.pending == 0
+
+
+def test_cancelled_timer_does_not_fire():
+    """Cancelling removes a timer, including one waiting to cascade."""
+    wheel = HierarchicalTimerWheel(tick=1.0, size=4, levels=2)
+    fired = []
+    near = wheel.schedule(2, lambda: fired.append('near'))
+    far = wheel.schedule(30, lambda: fired.append('far'))
+    wheel.schedule(40, lambda: fired.append('kept'))
+    wheel.cancel(near)
+    wheel.cancel(far)
+
+    assert wheel.advance(50) == 1
+    assert fired == ['kept']
+    assert wheel.pending == 0
+
+
+def test_idle_time_is_skipped():
+    """A week of idle ticks costs a handful of steps, not one per tick."""
+    wheel = HierarchicalTimerWheel(tick=1.0, size=64, levels=4)
+    steps = []
+    cascade = wheel._cascade
+    wheel._cascade = lambda: steps.append(wheel._current) or cascade()
+    week = 7 * 24 * 3600
+    fired = []
+    wheel.schedule(week, lambda: fired.append(wheel._current))
+
+    assert wheel.advance(week - 1) == 0
+    assert wheel.advance(week) == 1
+    assert fired == [week]
+    assert len(steps) < 10
+
+    steps.clear()
+    assert wheel.advance(2 * week) == 0
+    assert steps == []
+
+
+def test_sparse_timers_fire_on_their_tick():
+    """Skipping empty spans never fires a timer late or early."""
+    rng = random.Random(3)
+    wheel = HierarchicalTimerWheel(tick=1.0, size=4, levels=3)
+    fired = []
+    deadlines = sorted(rng.sample(range(1, 5000), 40))
+    for when in deadlines:
+        wheel.schedule(when, lambda when=when: fired.append((when, now)))
+
+    now = 0
+    for now in deadlines:
+        wheel.advance(now)
+
+    assert fired == [(when, when) for when in deadlines]
@@ -0,0 +1,54 @@
+import json
+import threading
+
+import pytest
+
+from retail.catalog import Catalog
+from retail.watcher import InotifyWatcher, PollingWatcher
+
+
+@pytest.mark.parametrize('watcher_class', [InotifyWatcher, PollingWatcher])
+def test_external_edit_triggers_one_reload(tmp_path, watcher_class):
+    """A burst of writes to the file leads to a single callback."""
+    path = tmp_path / 'products.json'
+    path.write_text('[]')
+    fired = threading.Event()
+    kwargs = {'interval': 0.05} if watcher_class is PollingWatcher else {}
+    watcher = watcher_class(tmp_path, 'products.json', fired.set,
+                            debounce=0.1, **kwargs).start()
+    try:
+        for stock in range(5):
+            path.write_text(json.dumps([{'name': 'laptop', 'stock': stock}]))
+        (tmp_path / 'other.json').write_text('{}')
+        assert fired.wait(5)
+    finally:
+        watcher.stop()
+    assert watcher.reloads == 1
+
+
+def test_catalog_reload_ignores_own_writes(tmp_path):
+    """Only edits made outside the catalog replace it."""
+    path = tmp_path / 'products.json'
+    catalog = Catalog(path, defaults=[{'name': 'laptop', 'stock': 10}])
+    catalog.find('laptop')['stock'] = 7
+    catalog.write()
+    assert not catalog.reload()
+
+    path.write_text(json.dumps([{'name': 'laptop', 'stock': 2}], indent=2))
+    version = catalog.version
+    assert catalog.reload()
+    assert catalog.find('laptop')['stock'] == 2
+    assert catalog.version > version
+
+
+def test_reload_errors_are_logged(tmp_path, caplog):
+    """A failing callback is logged and does not stop the watcher."""
+    def fail():
+        raise ValueError("bad catalog")
+
+    watcher = PollingWatcher(tmp_path, 'products.json', fail)
+    watcher._fire()
+
+    assert watcher.reloads == 1
+    assert caplog.records[-1].name == 'retail.watcher'
+    assert 'bad catalog' in caplog.records[-1].exc_text